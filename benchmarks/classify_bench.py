@@ -0,0 +1,83 @@
+"""Micro-benchmark: media classification over a corpus of submission URLs.
+
+Compares media.classify with the if/elif chain fetch_post used to run inline.
+URLs whose classification changed on purpose are listed separately from
+regressions.
+
+    python benchmarks/classify_bench.py [rounds]
+"""
+import os
+import sys
+import json
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media import classify
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "media_urls.json")
+
+
+def legacy_classify(url, media):
+    """The previous inline chain, kept only for comparison."""
+    if any(url.lower().endswith(ext) for ext in [".jpg", ".jpeg", ".png", ".gif"]):
+        return "direct_image", url
+    elif "v.redd.it" in url:
+        if media and media.get("reddit_video"):
+            if media["reddit_video"].get("fallback_url"):
+                return "reddit_video", media["reddit_video"]["fallback_url"]
+    elif any(domain in url.lower() for domain in ["redgifs.com", "gfycat.com"]):
+        return "redgifs", url
+    elif "imgur.com" in url.lower():
+        if not any(url.lower().endswith(ext) for ext in [".jpg", ".jpeg", ".png", ".gif"]):
+            return "imgur", url + ".jpg" if "/a/" not in url else url
+        return "imgur", url
+    return None
+
+
+# Deliberate changes from the legacy chain: (matches url, why)
+INTENDED_DIFFERENCES = [
+    (lambda url: "imgur.com/" in url.lower() and url.lower().endswith((".gifv", ".mp4", ".webm")),
+     "imgur video links become their .jpg still, not <id>.gifv.jpg"),
+    (lambda url: "imgur.com/gallery/" in url.lower(),
+     "imgur gallery pages are linked as they are, like albums"),
+]
+
+
+def intended_difference(url: str) -> str | None:
+    for matches, reason in INTENDED_DIFFERENCES:
+        if matches(url):
+            return reason
+    return None
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with open(CORPUS) as f:
+        corpus = [(entry["url"], entry.get("media")) for entry in json.load(f)]
+
+    mismatches = [
+        url for url, media in corpus
+        if (classify(url, media) or None) != (legacy_classify(url, media) or None)
+    ]
+    regressions = [url for url in mismatches if intended_difference(url) is None]
+    intended = {}
+    for url in mismatches:
+        reason = intended_difference(url)
+        if reason:
+            intended[reason] = intended.get(reason, 0) + 1
+
+    print(f"Corpus: {len(corpus)} URLs, {rounds} rounds")
+    for name, fn in [("legacy chain", legacy_classify), ("media.classify", classify)]:
+        seconds = timeit.timeit(lambda: [fn(url, media) for url, media in corpus], number=rounds)
+        per_url = seconds / (rounds * len(corpus)) * 1e9
+        print(f"{name:>15}: {seconds * 1000:8.1f} ms total, {per_url:6.0f} ns/url")
+    for reason, count in intended.items():
+        print(f"Intended difference: {count} URLs ({reason})")
+    print(f"Classification regressions: {len(regressions)}")
+    for url in regressions[:10]:
+        print(f"- {url}")
+
+
+if __name__ == "__main__":
+    main()
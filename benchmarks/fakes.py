@@ -0,0 +1,168 @@
+"""In-process stand-ins for Reddit and Discord used by the benchmarks.
+
+FakeRedditHTTP replaces the aiohttp session asyncpraw talks through, so the
+real asyncpraw/asyncprawcore stack (auth, listing generators, rate-limit
+headers, BudgetRequestor) runs unchanged against canned responses.
+FakeChannel records sends. The MongoDB stand-in is shared with the tests and
+lives in tests/fakes_mongo.py.
+"""
+import json
+import time
+import zlib
+import asyncio
+from copy import deepcopy
+from types import SimpleNamespace
+
+# ─── Reddit ─────────────────────────────────────────────────────────────────────
+
+
+def _vary(url: str, tag: str) -> str:
+    """Make a recorded media URL unique by tagging its last path segment."""
+    base, sep, query = url.partition("?")
+    head, _, last = base.rstrip("/").rpartition("/")
+    stem, dot, ext = last.partition(".")
+    return f"{head}/{stem}{tag}{dot}{ext}" + (sep + query if sep else "")
+
+
+class FakeResponse:
+    def __init__(self, payload, status: int = 200):
+        self.status = status
+        self._body = json.dumps(payload)
+        self.headers = {
+            "content-type": "application/json",
+            "content-length": str(len(self._body)),
+            # A fresh window on every response, so neither asyncprawcore's
+            # limiter nor RateBudget ever sleeps
+            "x-ratelimit-remaining": "990",
+            "x-ratelimit-used": "0",
+            "x-ratelimit-reset": "600",
+        }
+
+    async def json(self):
+        return json.loads(self._body)
+
+    async def text(self):
+        return self._body
+
+
+class FakeRedditHTTP:
+    """aiohttp.ClientSession stand-in serving /new listings from recorded JSON.
+
+    Any subreddit name maps onto one of the recorded listings. Every /new
+    request "publishes" `fresh_per_request` new submissions copied from the
+    recording with unique ids and media URLs, so the pipeline keeps finding
+    unsent media however many channels draw on it, and before= cursors behave
+    like they do against a live subreddit.
+    """
+
+    def __init__(self, listings_path: str, latency: float = 0.0, fresh_per_request: int = 25):
+        with open(listings_path) as f:
+            recorded = json.load(f)
+        self.templates = [
+            [child["data"] for child in listing["data"]["children"]]
+            for listing in recorded.values()
+        ]
+        self.latency = latency
+        self.fresh_per_request = fresh_per_request
+        self.posts = {}  # subreddit -> newest-first list of submission data
+        self.seq = 0
+        self.requests = 0
+        self._default_headers = {}
+
+    def _publish(self, subreddit: str, count: int):
+        template = self.templates[zlib.crc32(subreddit.encode()) % len(self.templates)]
+        posts = self.posts.setdefault(subreddit, [])
+        for _ in range(count):
+            self.seq += 1
+            data = deepcopy(template[self.seq % len(template)])
+            post_id = f"b{self.seq:x}"
+            data.update(
+                id=post_id,
+                name=f"t3_{post_id}",
+                url=_vary(data["url"], post_id),
+                permalink=f"/r/{subreddit}/comments/{post_id}/",
+                subreddit=subreddit,
+                subreddit_name_prefixed=f"r/{subreddit}",
+                created_utc=1_760_000_000.0 + self.seq,
+                stickied=False,
+            )
+            video = (data.get("media") or {}).get("reddit_video")
+            if video:
+                video["fallback_url"] = f"{data['url']}/DASH_720.mp4?source=fallback"
+            posts.insert(0, data)
+        del posts[1000:]
+
+    def _listing(self, names: list[str], params: dict) -> dict:
+        limit = int(params.get("limit", 25))
+        before = params.get("before")
+        posts = []
+        for name in names:
+            self._publish(name, self.fresh_per_request)
+            sub_posts = self.posts[name]
+            if before:
+                cut = next((i for i, p in enumerate(sub_posts) if p["name"] == before), len(sub_posts))
+                sub_posts = sub_posts[:cut]
+            posts.extend(sub_posts)
+        posts.sort(key=lambda p: p["created_utc"], reverse=True)
+        children = [{"kind": "t3", "data": p} for p in posts[:limit]]
+        return {"kind": "Listing", "data": {"after": None, "before": None, "dist": len(children), "children": children}}
+
+    async def request(self, method: str, url: str, params=None, **kwargs):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = dict(params or {})
+        if url.endswith("/api/v1/access_token"):
+            return FakeResponse({"access_token": "bench", "token_type": "bearer", "expires_in": 86400, "scope": "*"})
+        path = url.split("://", 1)[-1].split("/", 1)[-1].rstrip("/")
+        parts = path.split("/")
+        if len(parts) == 3 and parts[0] == "r" and parts[2] == "new":
+            return FakeResponse(self._listing([n.lower() for n in parts[1].split("+")], params))
+        if len(parts) == 3 and parts[0] == "r" and parts[2] == "about":
+            name = parts[1]
+            return FakeResponse({"kind": "t5", "data": {
+                "display_name": name, "name": f"t5_{name}", "id": name, "over18": True, "subscribers": 1000,
+            }})
+        return FakeResponse({"message": "Not Found", "error": 404}, status=404)
+
+    async def close(self):
+        pass
+
+
+# ─── Discord ────────────────────────────────────────────────────────────────────
+
+class FakeChannel:
+    """Text channel stand-in; send() waits latency seconds and records the call."""
+
+    def __init__(self, channel_id: int, latency: float = 0.0, on_send=None):
+        self.id = channel_id
+        self.latency = latency
+        self.on_send = on_send
+        self.messages = 0
+        self.embeds = 0
+
+    async def send(self, content=None, *, embed=None, embeds=None, **kwargs):
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.messages += 1
+        self.embeds += len(embeds) if embeds else int(embed is not None)
+        if self.on_send:
+            self.on_send(time.perf_counter() - started)
+
+
+class FakeInteraction:
+    """Just enough of discord.Interaction to invoke a slash command callback."""
+
+    def __init__(self, channel_id: int, user_id: int = 0):
+        self.channel_id = channel_id
+        self.user = SimpleNamespace(id=user_id, guild_permissions=SimpleNamespace(manage_guild=True))
+        self.replies = []
+        self.response = SimpleNamespace(defer=self._defer, send_message=self._reply)
+        self.followup = SimpleNamespace(send=self._reply)
+
+    async def _defer(self, *args, **kwargs):
+        pass
+
+    async def _reply(self, content=None, **kwargs):
+        self.replies.append(content)
@@ -0,0 +1,214 @@
+"""Offline throughput benchmark for the posting pipeline.
+
+Drives fetch_post, one auto_post_loop tick and /forcesend against the
+in-process fakes in benchmarks/fakes.py, so no Discord, Reddit or MongoDB
+credentials are needed. Listings come from benchmarks/listings.json, which
+has the shape of Reddit's /r/<sub>/new.json; any saved responses can be
+dropped in. Each scenario starts cold (empty pools, caches and history).
+
+    python benchmarks/pipeline_bench.py [--channels 10 100 1000]
+        [--reddit-ms 150] [--mongo-ms 5] [--discord-ms 80] [--count 5]
+
+Reports posts/sec, p50/p99 latency per stage and Mongo round-trips per post.
+Latencies are simulated round-trips; Discord rate limits are not modelled.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import functools
+import contextlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "tests"))
+
+# main.py exits at import without these; none of them is used for real here
+for var in ("DISCORD_TOKEN", "REDDIT_CLIENT_ID", "REDDIT_CLIENT_SECRET", "REDDIT_USERNAME", "REDDIT_PASSWORD"):
+    os.environ.setdefault(var, "benchmark")
+os.environ.setdefault("MONGO_URI", "mongodb://benchmark")
+
+import pymongo
+from fakes import FakeRedditHTTP, FakeChannel, FakeInteraction
+from fakes_mongo import FakeMongoClient
+
+# main binds MongoClient at import, so swap it in first
+pymongo.MongoClient = FakeMongoClient
+
+import asyncpraw
+
+with contextlib.redirect_stdout(open(os.devnull, "w")):
+    import main
+from ratelimit import BudgetRequestor
+
+LISTINGS = os.path.join(HERE, "listings.json")
+
+# Pipeline stages timed by wrapping the module-level functions main calls
+STAGES = {
+    "fetch_post": "fetch_post",
+    "listing": "fetch_listing",
+    "multireddit": "fetch_multireddit_listing",
+    "dedup": "get_sent_media",
+    "recheck": "is_media_sent",
+    "mark_sent": "mark_media_sent",
+    "embed": "build_embed",
+}
+
+samples = {}  # stage -> list of seconds
+
+
+def record(stage: str, seconds: float):
+    samples.setdefault(stage, []).append(seconds)
+
+
+def timed(stage: str, fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            record(stage, time.perf_counter() - started)
+    return wrapper
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def reset(n: int, discord_latency: float) -> dict:
+    """Fresh channel configs and empty bot state for an n-channel scenario."""
+    subreddits = [f"bench{i}" for i in range(max(4, n // 5))]
+    configs = {}
+    channels = {}
+    for i in range(n):
+        channel_id = 10_000 + i
+        configs[channel_id] = {
+            "channel_id": channel_id,
+            "subs": [subreddits[i % len(subreddits)], subreddits[(i + 1) % len(subreddits)]],
+            "interval": 30,
+        }
+        channels[channel_id] = FakeChannel(channel_id, discord_latency, on_send=lambda s: record("discord_send", s))
+    main.config_cache.configs = configs
+    main.bot.get_channel = channels.get
+
+    for pool in (main.candidate_pool.pools, main.channel_queues, main.LAST_SENT, main.last_backfill,
+                 main.subreddit_health.state, main.listing_cursors.cursors, main.rotation.last,
+                 main.mongo.op_stats):
+        pool.clear()
+    main.claimed_media.clear()
+    main.subreddit_cache.clear()
+    main.post_scheduler.clear()
+    main.sent_media_col.collection.clear()
+    main.stats_col.collection.clear()
+    await main.sent_media_filter.warm(main.sent_media_col)
+    samples.clear()
+    return channels
+
+
+async def run_fetch_post(n: int, args) -> int:
+    semaphore = asyncio.Semaphore(main.AUTO_POST_CONCURRENCY)
+
+    async def one(cfg):
+        async with semaphore:
+            sub = main.pick_subreddit(cfg["channel_id"], cfg["subs"])
+            return await main.fetch_post(sub) if sub else None
+
+    results = await asyncio.gather(*(one(cfg) for cfg in main.config_cache.all()))
+    return sum(1 for post in results if post)
+
+
+async def run_auto_post(n: int, args) -> int:
+    now = time.time()
+    for cfg in main.config_cache.all():
+        main.post_scheduler.schedule(cfg["channel_id"], now)
+    started = time.perf_counter()
+    await main.auto_post_loop.coro()
+    record("tick", time.perf_counter() - started)
+    return main.LAST_TICK["posted"]
+
+
+async def run_forcesend(n: int, args) -> int:
+    embeds_before = main.outbox.embeds
+    interaction = FakeInteraction(channel_id=0, user_id=main.BOT_OWNER_ID)
+    await main.forcesend.callback(interaction, count=args.count)
+    return main.outbox.embeds - embeds_before
+
+
+SCENARIOS = {
+    "fetch_post": run_fetch_post,
+    "auto_post_loop": run_auto_post,
+    "forcesend": run_forcesend,
+}
+
+
+def report(name: str, n: int, posts: int, elapsed: float, reddit_requests: int, messages: int):
+    round_trips = sum(count for count, _ in main.mongo.op_stats.values())
+    per_post = f"{round_trips / posts:.2f}" if posts else "-"
+    print(f"\n{name} @ {n} channels: {posts} posts in {elapsed:.2f}s "
+          f"({posts / elapsed:.1f} posts/s), {messages} Discord messages")
+    print(f"  Mongo round-trips: {round_trips} ({per_post}/post) | Reddit requests: {reddit_requests}")
+    print(f"  {'stage':<14}{'calls':>7}{'p50 ms':>10}{'p99 ms':>10}")
+    for stage in [*STAGES, "discord_send", "tick"]:
+        values = samples.get(stage)
+        if values:
+            print(f"  {stage:<14}{len(values):>7}{percentile(values, 50) * 1000:>10.1f}{percentile(values, 99) * 1000:>10.1f}")
+
+
+async def run(args):
+    FakeMongoClient.latency = args.mongo_ms / 1000
+    http = FakeRedditHTTP(LISTINGS, latency=args.reddit_ms / 1000, fresh_per_request=args.fresh)
+    main.session = http
+    main.reddit = asyncpraw.Reddit(
+        client_id="benchmark",
+        client_secret="benchmark",
+        username="benchmark",
+        password="benchmark",
+        user_agent="benchmark:pipeline_bench:v1.0 (offline)",
+        check_for_updates=False,
+        requestor_class=BudgetRequestor,
+        requestor_kwargs={"session": http, "budget": main.reddit_budget}
+    )
+    for stage, name in STAGES.items():
+        setattr(main, name, timed(stage, getattr(main, name)))
+    main.candidate_pool.start()
+
+    print(f"Simulated latency: Reddit {args.reddit_ms}ms, Mongo {args.mongo_ms}ms, Discord {args.discord_ms}ms; "
+          f"concurrency {main.AUTO_POST_CONCURRENCY}, forcesend count {args.count}")
+    quiet = open(os.devnull, "w")
+    try:
+        for n in args.channels:
+            for name in args.scenarios:
+                channels = await reset(n, args.discord_ms / 1000)
+                requests_before = http.requests
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(quiet):
+                    posts = await SCENARIOS[name](n, args)
+                    # Count the write-behind traffic the scenario generated
+                    await main.flush_write_behind()
+                elapsed = time.perf_counter() - started
+                messages = sum(channel.messages for channel in channels.values())
+                report(name, n, posts, elapsed, http.requests - requests_before, messages)
+    finally:
+        await main.candidate_pool.stop()
+        await main.reddit.close()
+        main.mongo.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--channels", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--reddit-ms", type=float, default=150.0, help="simulated Reddit API latency")
+    parser.add_argument("--mongo-ms", type=float, default=5.0, help="simulated Mongo round-trip")
+    parser.add_argument("--discord-ms", type=float, default=80.0, help="simulated Discord send latency")
+    parser.add_argument("--count", type=int, default=5, help="posts per channel for /forcesend (1-5)")
+    parser.add_argument("--fresh", type=int, default=25, help="new submissions per subreddit per listing request")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
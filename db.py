@@ -0,0 +1,531 @@
+"""Async access to MongoDB for the bot.
+
+pymongo is a blocking driver: every call made straight from a coroutine stalls
+the event loop (and with it the Discord gateway heartbeat) for a full Atlas
+round-trip. MongoRepository runs each call on a small dedicated thread pool so
+the loop keeps servicing other tasks while Mongo is busy.
+"""
+import os
+import math
+import time
+import asyncio
+import hashlib
+import functools
+from abc import ABC, abstractmethod
+from datetime import UTC, datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import ReturnDocument, UpdateOne
+
+MONGO_WORKERS = int(os.getenv("MONGO_WORKERS", "8"))
+# MONGO_INLINE=1 runs pymongo calls directly on the loop (the old behaviour).
+# Only useful for comparing loop lag against the executor mode via /dbstats.
+MONGO_INLINE = os.getenv("MONGO_INLINE", "0") == "1"
+
+
+class MongoRepository:
+    """Owns the executor that every collection wrapper dispatches to."""
+
+    def __init__(self, database, workers: int = MONGO_WORKERS, inline: bool = MONGO_INLINE):
+        self.database = database
+        self.inline = inline
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mongo")
+        # collection name -> [op count, total seconds]
+        self.op_stats = {}
+        self.on_op = None  # optional callback(collection name, seconds)
+
+    @property
+    def mode(self) -> str:
+        return "inline" if self.inline else f"executor({self.executor._max_workers})"
+
+    def collection(self, name: str) -> "AsyncCollection":
+        return AsyncCollection(self, self.database[name])
+
+    async def run(self, collection_name: str, fn, *args, **kwargs):
+        """Run a blocking pymongo call without holding the event loop."""
+        start = time.perf_counter()
+        try:
+            if self.inline:
+                return fn(*args, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = self.op_stats.setdefault(collection_name, [0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            if self.on_op:
+                self.on_op(collection_name, elapsed)
+
+    async def ping(self):
+        return await self.run("admin", self.database.client.admin.command, "ping")
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class AsyncCollection:
+    """Awaitable mirror of the pymongo Collection methods the bot uses."""
+
+    def __init__(self, repo: MongoRepository, collection):
+        self.repo = repo
+        self.collection = collection
+
+    @property
+    def name(self) -> str:
+        return self.collection.name
+
+    async def _run(self, fn, *args, **kwargs):
+        return await self.repo.run(self.name, fn, *args, **kwargs)
+
+    async def find(self, *args, **kwargs) -> list:
+        # Cursor iteration is blocking too, so materialise it on the worker.
+        return await self._run(lambda: list(self.collection.find(*args, **kwargs)))
+
+    async def find_one(self, *args, **kwargs):
+        return await self._run(self.collection.find_one, *args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return await self._run(self.collection.count_documents, *args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        return await self._run(self.collection.insert_one, *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return await self._run(self.collection.update_one, *args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return await self._run(self.collection.find_one_and_update, *args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs):
+        return await self._run(self.collection.delete_one, *args, **kwargs)
+
+    async def delete_many(self, *args, **kwargs):
+        return await self._run(self.collection.delete_many, *args, **kwargs)
+
+    async def bulk_write(self, *args, **kwargs):
+        return await self._run(self.collection.bulk_write, *args, **kwargs)
+
+    async def create_index(self, *args, **kwargs):
+        return await self._run(self.collection.create_index, *args, **kwargs)
+
+    async def index_information(self):
+        return await self._run(self.collection.index_information)
+
+    async def drop_index(self, *args, **kwargs):
+        return await self._run(self.collection.drop_index, *args, **kwargs)
+
+    async def stats(self) -> dict:
+        """collStats for this collection (document count, data and index sizes)."""
+        return await self._run(self.collection.database.command, "collStats", self.name)
+
+
+async def measure_loop_lag(duration: float = 2.0, interval: float = 0.01) -> dict:
+    """Sample how late the loop wakes a sleeping task, in milliseconds."""
+    loop = asyncio.get_running_loop()
+    lags = []
+    end = loop.time() + duration
+    while loop.time() < end:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - start - interval) * 1000)
+    if not lags:
+        return {"samples": 0, "avg_ms": 0.0, "max_ms": 0.0}
+    return {"samples": len(lags), "avg_ms": sum(lags) / len(lags), "max_ms": max(lags)}
+
+
+class SentMediaFilter:
+    """Time-bucketed Bloom filter mirroring the sent_media TTL collection.
+
+    Keyed by the same media keys the collection uses as _id. One bucket per
+    day; buckets older than the collection's TTL are dropped, so the filter
+    forgets keys on the same schedule as Mongo does. A negative answer is
+    definitive once the filter has been warmed, a positive answer only means
+    "maybe" and has to be confirmed against the collection.
+    """
+
+    def __init__(self, ttl_days: int = 7, capacity: int = 50_000, error_rate: float = 0.01):
+        self.ttl_days = ttl_days
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.buckets = {}  # day number -> bytearray
+        self.ready = False
+        self.added = 0
+        self.negatives = 0
+        self.maybes = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _expire(self, today: int):
+        for day in [d for d in self.buckets if d < today - self.ttl_days]:
+            del self.buckets[day]
+
+    def add(self, key: str, when: float | None = None):
+        now = time.time()
+        day = int((now if when is None else when) // 86400)
+        today = int(now // 86400)
+        if day < today - self.ttl_days:
+            return
+        self._expire(today)
+        bits = self.buckets.get(day)
+        if bits is None:
+            bits = self.buckets[day] = bytearray((self.num_bits + 7) // 8)
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.added += 1
+
+    def might_contain(self, key: str) -> bool:
+        # Until warmed we know nothing, so everything is a possible positive.
+        if not self.ready:
+            return True
+        self._expire(int(time.time() // 86400))
+        positions = self._positions(key)
+        for bits in self.buckets.values():
+            if all(bits[pos >> 3] & (1 << (pos & 7)) for pos in positions):
+                self.maybes += 1
+                return True
+        self.negatives += 1
+        return False
+
+    def clear(self):
+        self.buckets.clear()
+        self.added = 0
+
+    async def warm(self, collection: AsyncCollection):
+        """Load every media key still alive in the collection."""
+        self.ready = False
+        self.clear()
+        docs = await collection.find({}, {"timestamp": 1})
+        for doc in docs:
+            ts = doc.get("timestamp")
+            if ts is not None and ts.tzinfo is None:
+                ts = ts.replace(tzinfo=UTC)  # pymongo hands back naive UTC
+            self.add(doc["_id"], ts.timestamp() if ts else None)
+        self.ready = True
+        return len(docs)
+
+
+class ConfigCache:
+    """Authoritative in-process copy of the channel configs collection.
+
+    Reads are dict lookups. Mutations go to Mongo first and the cache stores
+    the document Mongo returns, so a failed write never leaves the cache ahead
+    of the database. Edits made outside the bot are picked up by refresh(),
+    which a background task calls on an interval.
+    """
+
+    def __init__(self, collection: AsyncCollection):
+        self.collection = collection
+        self.configs = {}  # channel_id -> config document
+        self.loaded = False
+        self.refreshed_at = None
+        self.version = 0  # bumped on every change, so dependants can rebuild lazily
+        # Channels written while a reload was in flight; the reload's older
+        # snapshot must not overwrite them
+        self._written = set()
+
+    def __len__(self):
+        return len(self.configs)
+
+    def get(self, channel_id: int) -> dict:
+        return self.configs.get(channel_id) or {}
+
+    def all(self) -> list[dict]:
+        return list(self.configs.values())
+
+    async def load(self):
+        self._written = set()
+        docs = await self.collection.find()
+        configs = {doc["channel_id"]: doc for doc in docs if doc.get("channel_id")}
+        for channel_id in self._written:
+            if channel_id in self.configs:
+                configs[channel_id] = self.configs[channel_id]
+            else:
+                configs.pop(channel_id, None)
+        self.configs = configs
+        self.loaded = True
+        self.refreshed_at = time.time()
+        return len(self.configs)
+
+    async def refresh(self) -> set[int]:
+        """Reload from Mongo and return the channel ids whose config changed."""
+        old = self.configs
+        await self.load()
+        changed = {cid for cid in old.keys() | self.configs.keys() if old.get(cid) != self.configs.get(cid)}
+        if changed:
+            self.version += 1
+        return changed
+
+    async def update(self, channel_id: int, update: dict, upsert: bool = False) -> dict:
+        """Write-through update of one channel's config."""
+        doc = await self.collection.find_one_and_update(
+            {"channel_id": channel_id}, update,
+            upsert=upsert, return_document=ReturnDocument.AFTER
+        )
+        self._written.add(channel_id)
+        self.version += 1
+        if doc:
+            self.configs[channel_id] = doc
+        else:
+            self.configs.pop(channel_id, None)
+        return doc or {}
+
+    async def delete(self, channel_id: int):
+        await self.collection.delete_one({"channel_id": channel_id})
+        self._written.add(channel_id)
+        self.version += 1
+        self.configs.pop(channel_id, None)
+
+
+class WriteBehindStore(ABC):
+    """Base for small per-key documents that are buffered and upserted by flush().
+
+    Subclasses keep their state in memory, add changed keys to pending and
+    say in _update() which document a key maps to. flush() writes every
+    pending key as one unordered bulk_write, which the bot runs on an
+    interval and at shutdown; if that fails the keys are queued again. Values
+    are read at flush time, so a retry always writes the newest one.
+    """
+
+    def __init__(self, collection: AsyncCollection):
+        self.collection = collection
+        self.pending = set()  # keys changed since the last flush
+        self.flushes = 0
+        self.flushed = 0
+
+    @abstractmethod
+    def _update(self, key) -> tuple[dict, dict] | None:
+        """(filter, fields to $set) for a key's document, or None to skip it."""
+
+    async def flush(self) -> int:
+        if not self.pending:
+            return 0
+        batch, self.pending = self.pending, set()
+        ops = []
+        for key in batch:
+            update = self._update(key)
+            if update:
+                ops.append(UpdateOne(update[0], {"$set": update[1]}, upsert=True))
+        try:
+            if ops:
+                await self.collection.bulk_write(ops, ordered=False)
+        except Exception:
+            self.pending |= batch
+            raise
+        self.flushes += 1
+        self.flushed += len(ops)
+        return len(ops)
+
+
+class LastSentStore(WriteBehindStore):
+    """Write-behind persistence of per-channel last post times.
+
+    Each channel has its own small {"type": "last_sent", "channel_id", "time"}
+    document, so a post touches one fixed-size document instead of rewriting
+    a map of every channel.
+    """
+
+    def __init__(self, collection: AsyncCollection):
+        super().__init__(collection)
+        self.times = {}  # channel_id -> datetime
+
+    def mark(self, channel_id: int, when: datetime):
+        self.times[channel_id] = when
+        self.pending.add(channel_id)
+
+    def _update(self, channel_id: int):
+        return {"type": "last_sent", "channel_id": channel_id}, {"time": self.times[channel_id]}
+
+    async def load(self) -> dict:
+        """Read every channel's last post time, migrating the old single-map layout."""
+        result = {}
+        legacy = await self.collection.find_one({"type": "last_sent", "data": {"$exists": True}})
+        if legacy:
+            for cid, value in legacy["data"].items():
+                self.mark(int(cid), datetime.fromisoformat(value))
+            result.update(self.times)
+        for doc in await self.collection.find({"type": "last_sent", "channel_id": {"$exists": True}}):
+            when = doc["time"]
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=UTC)  # pymongo hands back naive UTC
+            if doc["channel_id"] not in result or when > result[doc["channel_id"]]:
+                result[doc["channel_id"]] = when
+                self.times[doc["channel_id"]] = when
+                self.pending.discard(doc["channel_id"])
+        if legacy:
+            await self.flush()
+            await self.collection.delete_one({"_id": legacy["_id"]})
+        return result
+
+
+class StatsAccumulator:
+    """Write-behind aggregator for per-channel posting statistics.
+
+    Posts only merge increments into memory. flush() turns everything pending
+    into one upsert per channel and sends them as a single bulk_write; it runs
+    on the bot's flush interval, when max_pending increments have built up,
+    and at shutdown.
+    """
+
+    def __init__(self, collection: AsyncCollection, max_pending: int = 200):
+        self.collection = collection
+        self.max_pending = max_pending
+        self.pending = {}  # channel_id -> {"total_posts", "subreddit_counts", "set"}
+        self.pending_ops = 0
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._lock = asyncio.Lock()
+        self._flush_task = None
+
+    def add(self, channel_id: int, post_url: str, subreddit: str, when: datetime):
+        entry = self.pending.setdefault(channel_id, {"total_posts": 0, "subreddit_counts": {}, "set": {}})
+        entry["total_posts"] += 1
+        entry["subreddit_counts"][subreddit] = entry["subreddit_counts"].get(subreddit, 0) + 1
+        entry["set"] = {"last_post_url": post_url, "last_post_time": when}
+        self.pending_ops += 1
+        if self.pending_ops >= self.max_pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush_quietly())
+
+    def merged(self, channel_id: int, doc: dict | None) -> dict | None:
+        """Overlay not-yet-flushed increments on a stored stats document."""
+        entry = self.pending.get(channel_id)
+        if not entry:
+            return doc
+        doc = dict(doc or {})
+        doc["total_posts"] = doc.get("total_posts", 0) + entry["total_posts"]
+        counts = dict(doc.get("subreddit_counts", {}))
+        for sub, count in entry["subreddit_counts"].items():
+            counts[sub] = counts.get(sub, 0) + count
+        doc["subreddit_counts"] = counts
+        doc.update(entry["set"])
+        return doc
+
+    async def _flush_quietly(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Error flushing channel stats: {e}")
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, {}
+            pending_ops, self.pending_ops = self.pending_ops, 0
+            ops = []
+            for channel_id, entry in batch.items():
+                inc = {"total_posts": entry["total_posts"]}
+                inc.update({f"subreddit_counts.{sub}": n for sub, n in entry["subreddit_counts"].items()})
+                ops.append(UpdateOne(
+                    {"type": "channel_stats", "channel_id": channel_id},
+                    {"$inc": inc, "$set": entry["set"]},
+                    upsert=True
+                ))
+            start = time.perf_counter()
+            try:
+                await self.collection.bulk_write(ops, ordered=False)
+            except Exception:
+                # Merge the batch back so the increments aren't lost
+                for channel_id, entry in batch.items():
+                    current = self.pending.setdefault(channel_id, {"total_posts": 0, "subreddit_counts": {}, "set": entry["set"]})
+                    current["total_posts"] += entry["total_posts"]
+                    for sub, n in entry["subreddit_counts"].items():
+                        current["subreddit_counts"][sub] = current["subreddit_counts"].get(sub, 0) + n
+                self.pending_ops += pending_ops
+                raise
+            latency = time.perf_counter() - start
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.flushes += 1
+            self.flushed_ops += pending_ops
+            return pending_ops
+
+    def stats(self) -> dict:
+        return {
+            "pending_ops": self.pending_ops,
+            "pending_channels": len(self.pending),
+            "flushes": self.flushes,
+            "flushed_ops": self.flushed_ops,
+            "last_flush_ms": self.last_flush_latency * 1000,
+            "max_flush_ms": self.max_flush_latency * 1000,
+        }
+
+
+class ListingCursorStore(WriteBehindStore):
+    """Per-subreddit high-water marks for incremental /new fetches.
+
+    Stores the fullname and created_utc of the newest submission seen in each
+    subreddit as {"type": "listing_cursor", "subreddit", "fullname",
+    "created_utc"} documents.
+    """
+
+    def __init__(self, collection: AsyncCollection):
+        super().__init__(collection)
+        self.cursors = {}  # subreddit -> (fullname, created_utc)
+
+    def get(self, subreddit: str):
+        return self.cursors.get(subreddit)
+
+    def advance(self, subreddit: str, fullname: str, created_utc: float):
+        current = self.cursors.get(subreddit)
+        if current is None or created_utc > current[1]:
+            self.cursors[subreddit] = (fullname, created_utc)
+            self.pending.add(subreddit)
+
+    def reset(self, subreddit: str, fullname: str, created_utc: float):
+        self.cursors[subreddit] = (fullname, created_utc)
+        self.pending.add(subreddit)
+
+    def _update(self, subreddit: str):
+        if subreddit in self.cursors:
+            fullname, created_utc = self.cursors[subreddit]
+            return ({"type": "listing_cursor", "subreddit": subreddit},
+                    {"fullname": fullname, "created_utc": created_utc})
+        return None
+
+    async def load(self) -> int:
+        for doc in await self.collection.find({"type": "listing_cursor"}):
+            self.cursors[doc["subreddit"]] = (doc["fullname"], doc["created_utc"])
+        return len(self.cursors)
+
+
+class RotationStore(WriteBehindStore):
+    """Per-channel round-robin over a channel's subreddits.
+
+    Remembers the subreddit each channel was last served from as
+    {"type": "rotation", "channel_id", "last"} documents, so the rotation
+    carries on after a restart instead of starting over. Keying on the name
+    rather than an index keeps the order stable when subs are added or
+    removed.
+    """
+
+    def __init__(self, collection: AsyncCollection):
+        super().__init__(collection)
+        self.last = {}  # channel_id -> subreddit
+
+    def start(self, channel_id: int, subreddits: list[str]) -> int:
+        """Index of the subreddit after the one this channel last used."""
+        try:
+            return (subreddits.index(self.last.get(channel_id)) + 1) % len(subreddits)
+        except ValueError:
+            return 0
+
+    def mark(self, channel_id: int, subreddit: str):
+        self.last[channel_id] = subreddit
+        self.pending.add(channel_id)
+
+    def _update(self, channel_id: int):
+        if channel_id in self.last:
+            return {"type": "rotation", "channel_id": channel_id}, {"last": self.last[channel_id]}
+        return None
+
+    async def load(self) -> int:
+        for doc in await self.collection.find({"type": "rotation"}):
+            self.last[doc["channel_id"]] = doc["last"]
+        return len(self.last)
@@ -0,0 +1,93 @@
+"""Outbound Discord delivery with one queue per channel."""
+import time
+import asyncio
+from collections import deque
+
+# Discord's limits for a single message
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+
+
+class Outbox:
+    """Per-channel send queues that pack ready embeds into shared messages.
+
+    Each channel has at most one worker draining its queue, so messages to a
+    channel go out one at a time; discord.py's HTTP client already waits on
+    the per-route rate-limit bucket for each of those sends. Different
+    channels have different workers and run in parallel.
+    """
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self.queues = {}  # channel_id -> deque of (embed, future)
+        self.workers = {}  # channel_id -> task
+        self.messages = 0
+        self.embeds = 0
+        self.failures = 0
+        self._sent_at = deque()  # send timestamps inside the rate window
+        self.on_send = None  # optional callback(seconds, embeds in the message)
+
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    async def send(self, channel, embed):
+        """Queue an embed for a channel and wait until it has been delivered."""
+        future = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(channel.id, deque()).append((embed, future))
+        worker = self.workers.get(channel.id)
+        if worker is None or worker.done():
+            self.workers[channel.id] = asyncio.create_task(self._drain(channel))
+        return await future
+
+    def _next_batch(self, queue: deque) -> list:
+        batch, chars = [], 0
+        while queue and len(batch) < MAX_EMBEDS:
+            size = len(queue[0][0])
+            if batch and chars + size > MAX_EMBED_CHARS:
+                break
+            batch.append(queue.popleft())
+            chars += size
+        return batch
+
+    async def _drain(self, channel):
+        queue = self.queues[channel.id]
+        # Let callers that are queueing in the same tick join the first batch
+        await asyncio.sleep(0)
+        while queue:
+            batch = self._next_batch(queue)
+            started = time.perf_counter()
+            try:
+                await channel.send(embeds=[embed for embed, _ in batch])
+            except Exception as e:
+                self.failures += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            if self.on_send:
+                self.on_send(time.perf_counter() - started, len(batch))
+            self.messages += 1
+            self.embeds += len(batch)
+            self._sent_at.append(time.monotonic())
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+        self.queues.pop(channel.id, None)
+        self.workers.pop(channel.id, None)
+
+    def rate(self) -> float:
+        """Messages per second over the last window."""
+        cutoff = time.monotonic() - self.window
+        while self._sent_at and self._sent_at[0] < cutoff:
+            self._sent_at.popleft()
+        return len(self._sent_at) / self.window
+
+    def stats(self) -> dict:
+        return {
+            "messages": self.messages,
+            "embeds": self.embeds,
+            "failures": self.failures,
+            "messages_per_sec": self.rate(),
+            "queue_depth": self.depth(),
+            "active_channels": len(self.workers),
+        }
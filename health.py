@@ -0,0 +1,70 @@
+"""Per-subreddit health: negative caching of dry subs and a circuit breaker for failing ones."""
+import time
+
+
+class SubredditHealth:
+    """Tracks which subreddits are worth fetching from right now.
+
+    A fetch that finds no media puts the sub in a negative cache for a while;
+    a fetch that errors or times out counts as a failure, and after
+    `threshold` consecutive failures the breaker opens. Both back off
+    exponentially while the problem persists. Once a backoff runs out the sub
+    gets one trial fetch (half-open); a success resets it, another miss
+    doubles the wait. Fatal errors (banned, private, missing) open the
+    breaker at the maximum backoff straight away.
+    """
+
+    def __init__(self, empty_backoff: float = 300.0, failure_backoff: float = 60.0,
+                 max_backoff: float = 3600.0, threshold: int = 3):
+        self.empty_backoff = empty_backoff
+        self.failure_backoff = failure_backoff
+        self.max_backoff = max_backoff
+        self.threshold = threshold
+        self.state = {}  # subreddit -> {"empties", "failures", "until", "reason"}
+        self.skipped = 0
+
+    def _entry(self, subreddit: str) -> dict:
+        return self.state.setdefault(subreddit.lower(), {"empties": 0, "failures": 0, "until": 0.0, "reason": None})
+
+    def _backoff(self, base: float, count: int) -> float:
+        return min(self.max_backoff, base * 2 ** max(0, count - 1))
+
+    def available(self, subreddit: str) -> bool:
+        entry = self.state.get(subreddit.lower())
+        return entry is None or entry["until"] <= time.monotonic()
+
+    def record_success(self, subreddit: str):
+        self.state.pop(subreddit.lower(), None)
+
+    def record_empty(self, subreddit: str):
+        entry = self._entry(subreddit)
+        entry["empties"] += 1
+        entry["until"] = time.monotonic() + self._backoff(self.empty_backoff, entry["empties"])
+        entry["reason"] = "no fresh media"
+
+    def record_failure(self, subreddit: str, reason: str, fatal: bool = False):
+        entry = self._entry(subreddit)
+        entry["failures"] += 1
+        entry["reason"] = reason
+        if fatal:
+            entry["until"] = time.monotonic() + self.max_backoff
+        elif entry["failures"] >= self.threshold:
+            tripped = entry["failures"] - self.threshold + 1
+            entry["until"] = time.monotonic() + self._backoff(self.failure_backoff, tripped)
+            print(f"Circuit open for r/{subreddit} after {entry['failures']} failures ({reason})")
+
+    def pick(self, subreddits: list[str], start: int = 0) -> str | None:
+        """First healthy subreddit at or after start (wrapping), or None if none are."""
+        count = len(subreddits)
+        for offset in range(count):
+            subreddit = subreddits[(start + offset) % count]
+            if self.available(subreddit):
+                return subreddit
+            self.skipped += 1
+        return None
+
+    def unhealthy(self) -> dict:
+        """Subreddits currently backed off -> (reason, seconds left)."""
+        now = time.monotonic()
+        return {sub: (entry["reason"], entry["until"] - now)
+                for sub, entry in self.state.items() if entry["until"] > now}
@@ -0,0 +1,138 @@
+"""Event-loop lag sampling and blocked-loop detection."""
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+
+
+class LoopWatchdog:
+    """Samples event-loop lag and captures what is running when the loop stalls.
+
+    A task on the loop sleeps `interval` seconds at a time and records how
+    late it wakes up; each wake-up is also a heartbeat. A daemon thread checks
+    the heartbeat and, once it is more than `threshold` seconds overdue, grabs
+    the loop thread's current stack, which is the callback or coroutine that
+    is holding the loop. Stats are read under a lock, so they can be read
+    from any thread.
+    """
+
+    def __init__(self, interval: float = 0.5, threshold: float = 0.1, window: int = 600,
+                 keep: int = 20, depth: int = 12):
+        self.interval = interval
+        self.threshold = threshold
+        self.depth = depth  # innermost stack frames kept per event
+        self.events = deque(maxlen=keep)
+        self.slow_callbacks = 0
+        self._lags = deque(maxlen=window)
+        self._beat = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._task = None
+        self._thread = None
+        self._loop_thread = None
+
+    def start(self, debug: bool = False):
+        """Start sampling on the running loop.
+
+        With debug, asyncio's own slow-callback detection is switched on at
+        the same threshold and its reports are recorded too. Debug mode adds
+        overhead to every task, so it is opt-in.
+        """
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        if debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+            logging.getLogger("asyncio").addHandler(_SlowCallbackHandler(self))
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = loop.create_task(self._sample())
+        self._thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sample(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            with self._lock:
+                self._lags.append(max(0.0, now - started - self.interval))
+                self._beat = now
+
+    def _record(self, event: dict):
+        with self._lock:
+            self.events.append(event)
+            self.slow_callbacks += 1
+
+    def _monitor(self):
+        stall = None
+        while not self._stop.wait(self.threshold / 2):
+            with self._lock:
+                overdue = time.monotonic() - self._beat - self.interval
+            if overdue > self.threshold:
+                if stall is None:
+                    frame = sys._current_frames().get(self._loop_thread)
+                    stack = traceback.format_stack(frame)[-self.depth:] if frame else []
+                    stall = {
+                        "at": time.time(),
+                        "blocked_ms": overdue * 1000,
+                        "source": "watchdog",
+                        "stack": [line.rstrip() for line in stack],
+                    }
+                    self._record(stall)
+                else:
+                    with self._lock:
+                        stall["blocked_ms"] = overdue * 1000
+            elif stall is not None:
+                where = stall["stack"][-1].strip().splitlines()[0] if stall["stack"] else "unknown"
+                print(f"⚠️ Event loop blocked for {stall['blocked_ms']:.0f}ms at {where}")
+                stall = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lags = sorted(self._lags)
+            events = [dict(event) for event in self.events]
+            beat = self._beat
+        stalled = 0.0 if beat is None else max(0.0, time.monotonic() - beat - self.interval)
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "samples": len(lags),
+            "avg_ms": sum(lags) / len(lags) * 1000 if lags else 0.0,
+            "p99_ms": lags[int(0.99 * (len(lags) - 1))] * 1000 if lags else 0.0,
+            "max_ms": lags[-1] * 1000 if lags else 0.0,
+            "stalled_ms": stalled * 1000 if stalled > self.threshold else 0.0,
+            "slow_callbacks": self.slow_callbacks,
+            "recent": events,
+        }
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Records asyncio debug mode's "Executing <handle> took N seconds" warnings."""
+
+    def __init__(self, watchdog: LoopWatchdog):
+        super().__init__(logging.WARNING)
+        self.watchdog = watchdog
+
+    def emit(self, record: logging.LogRecord):
+        if not record.msg.startswith("Executing") or len(record.args or ()) != 2:
+            return
+        handle, seconds = record.args
+        self.watchdog._record({
+            "at": time.time(),
+            "blocked_ms": seconds * 1000,
+            "source": "asyncio",
+            "stack": [str(handle)],
+        })
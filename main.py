@@ -6,31 +6,37 @@ if sys.version_info >= (3, 13):
     sys.modules['audioop'] = types.ModuleType('audioop')
 
 import os
+import time
+import signal
+import json
 import asyncio
+import hashlib
 import logging
-from flask import Flask
-from threading import Thread
 from datetime import datetime, timedelta, UTC
 import aiohttp
+from aiohttp import web
+from collections import deque
 from contextlib import asynccontextmanager
 
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, DeleteOne
 import asyncpraw
+from asyncprawcore.exceptions import Forbidden, NotFound, Redirect, UnavailableForLegalReasons
 from discord.errors import LoginFailure
 
-# ─── Flask Keepalive Server ─────────────────────────────────────────────────────
-app = Flask(__name__)
-
-@app.route("/")
-def home():
-    return "Bot is alive!"
-
-def run_flask():
-    app.run(host="0.0.0.0", port=8080)
+from db import MongoRepository, SentMediaFilter, ConfigCache, LastSentStore, StatsAccumulator, ListingCursorStore, RotationStore, measure_loop_lag
+from cache import TTLCache
+from pool import CandidatePool
+from scheduler import DueScheduler
+from ratelimit import RateBudget, BudgetRequestor, SingleFlight
+from media import Candidate, classify, media_key
+from delivery import Outbox
+from health import SubredditHealth
+from metrics import Registry
+from loopwatch import LoopWatchdog
 
 # ─── Environment Variables ──────────────────────────────────────────────────────
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -77,57 +83,219 @@ intents.guilds = intents.messages = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 tree = bot.tree
 
+# ─── Metrics ────────────────────────────────────────────────────────────────────
+# Served in Prometheus text format on /metrics. Gauges and derived counters
+# read the live objects at scrape time.
+METRICS = Registry()
+
+FETCH_POST_SECONDS = METRICS.histogram(
+    "bot_fetch_post_seconds", "fetch_post duration, by where the post came from", ("source",)
+)
+FETCH_STAGE_SECONDS = METRICS.histogram(
+    "bot_fetch_stage_seconds", "Time spent in each stage of fetching candidates", ("stage",)
+)
+MONGO_OP_SECONDS = METRICS.histogram(
+    "bot_mongo_op_seconds", "MongoDB operation latency, by collection", ("collection",)
+)
+DISCORD_SEND_SECONDS = METRICS.histogram("bot_discord_send_seconds", "Discord message send latency")
+TICK_SECONDS = METRICS.histogram(
+    "bot_auto_post_tick_seconds", "auto_post_loop tick duration",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+POSTS_TOTAL = METRICS.counter("bot_posts_total", "Posts delivered, by command or loop", ("path",))
+METRICS.gauge("bot_scheduler_backlog", "Channels past their posting deadline", fn=lambda: post_scheduler.backlog())
+METRICS.gauge("bot_scheduler_channels", "Channels in the posting schedule", fn=lambda: len(post_scheduler))
+METRICS.gauge("bot_auto_post_last_tick_due", "Channels due in the last auto_post_loop tick", fn=lambda: LAST_TICK["due"])
+METRICS.gauge("bot_reddit_ratelimit_remaining", "Reddit requests left in the window", fn=lambda: reddit_budget.remaining)
+METRICS.gauge("bot_reddit_ratelimit_capacity", "Reddit requests per window", fn=lambda: reddit_budget.capacity)
+METRICS.gauge(
+    "bot_reddit_ratelimit_reset_seconds", "Seconds until the Reddit rate-limit window resets",
+    fn=lambda: reddit_budget.stats()["reset_in"]
+)
+METRICS.counter("bot_reddit_requests_total", "Reddit API requests", fn=lambda: reddit_budget.requests)
+METRICS.counter("bot_reddit_ratelimit_waits_total", "Requests queued for the rate-limit reset", fn=lambda: reddit_budget.waits)
+METRICS.counter("bot_reddit_throttled_total", "Reddit 429 responses", fn=lambda: reddit_budget.throttled)
+METRICS.counter(
+    "bot_pool_requests_total", "Candidate pool lookups", ("result",),
+    fn=lambda: {("hit",): candidate_pool.hits, ("miss",): candidate_pool.misses}
+)
+METRICS.gauge("bot_pool_candidates", "Ready candidates across all pools", fn=lambda: len(candidate_pool))
+METRICS.gauge("bot_outbox_queue_depth", "Embeds waiting to be sent", fn=lambda: outbox.depth())
+METRICS.counter("bot_discord_messages_total", "Messages sent through the outbox", fn=lambda: outbox.messages)
+
+# Samples event-loop lag and captures the stack of whatever blocks the loop
+# for longer than the threshold. ASYNCIO_DEBUG=1 also turns on asyncio's own
+# slow-callback reports, at the cost of debug-mode overhead on every task.
+loop_watchdog = LoopWatchdog(
+    interval=float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.5")),
+    threshold=float(os.getenv("SLOW_CALLBACK_THRESHOLD_MS", "100")) / 1000
+)
+ASYNCIO_DEBUG = os.getenv("ASYNCIO_DEBUG", "0") == "1"
+METRICS.gauge(
+    "bot_event_loop_lag_seconds", "Event-loop lag over the watchdog window", ("stat",),
+    fn=lambda: {(stat,): loop_watchdog.stats()[f"{stat}_ms"] / 1000 for stat in ("avg", "p99", "max")}
+)
+METRICS.counter(
+    "bot_event_loop_slow_callbacks_total", "Times the loop was blocked past the threshold",
+    fn=lambda: loop_watchdog.slow_callbacks
+)
+
 # ─── MongoDB Setup ──────────────────────────────────────────────────────────────
 mongo_client = MongoClient(MONGO_URI)
 db = mongo_client["reddit_bot"]
-config_col = db["configs"]
-sent_media_col = db["sent_media"]
-stats_col = db["stats"]  # New collection for bot statistics
+# All collection access goes through the executor-backed repository so pymongo
+# round-trips never block the event loop.
+mongo = MongoRepository(db)
+mongo.on_op = lambda name, seconds: MONGO_OP_SECONDS.observe(seconds, collection=name)
+config_col = mongo.collection("configs")
+sent_media_col = mongo.collection("sent_media")
+stats_col = mongo.collection("stats")  # New collection for bot statistics
+
+# Channel configs live in memory; commands write through, a poller picks up
+# edits made outside the bot
+config_cache = ConfigCache(config_col)
+CONFIG_REFRESH_INTERVAL = int(os.getenv("CONFIG_REFRESH_INTERVAL", "300"))
+
+# Per-channel last post times, posting stats, subreddit rotation and
+# per-subreddit listing cursors, buffered and flushed in batches
+last_sent_store = LastSentStore(stats_col)
+listing_cursors = ListingCursorStore(stats_col)
+rotation = RotationStore(stats_col)
+channel_stats = StatsAccumulator(stats_col, max_pending=int(os.getenv("STATS_FLUSH_SIZE", "200")))
+WRITE_BEHIND_FLUSH_INTERVAL = int(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "30"))
+
+# In-process mirror of sent_media: URLs it has never seen skip Mongo entirely
+SENT_MEDIA_TTL_DAYS = 7
+sent_media_filter = SentMediaFilter(
+    ttl_days=SENT_MEDIA_TTL_DAYS,
+    capacity=int(os.getenv("SENT_MEDIA_FILTER_CAPACITY", "50000"))
+)
 
 async def is_media_sent(url: str) -> bool:
     """Check if media URL was already sent in the last week"""
+    key = media_key(url)
+    if not sent_media_filter.might_contain(key):
+        return False
     try:
-        return bool(sent_media_col.find_one({"url": url}))
+        with FETCH_STAGE_SECONDS.time(stage="dedup"):
+            return bool(await sent_media_col.find_one({"_id": key}, {"_id": 1}))
     except Exception as e:
         print(f"Error checking media sent status: {e}")
         return False  # On error, allow the post to be sent
 
+async def get_sent_media(urls: list[str]) -> set[str]:
+    """Return the subset of urls already sent in the last week, in one query"""
+    # Only possible positives from the filter need confirming against Mongo
+    keys = {}
+    for url in urls:
+        key = media_key(url)
+        if sent_media_filter.might_contain(key):
+            keys.setdefault(key, []).append(url)
+    if not keys:
+        return set()
+    try:
+        with FETCH_STAGE_SECONDS.time(stage="dedup"):
+            docs = await sent_media_col.find({"_id": {"$in": list(keys)}}, {"_id": 1})
+        return {url for doc in docs for url in keys[doc["_id"]]}
+    except Exception as e:
+        print(f"Error checking media sent status: {e}")
+        return set()  # On error, allow the posts to be sent
+
 async def mark_media_sent(url: str, post_id: str, subreddit: str):
     """Mark media URL as sent"""
+    key = media_key(url)
+    sent_media_filter.add(key)
     try:
-        sent_media_col.insert_one({
-            "url": url,
-            "post_id": post_id,
-            "subreddit": subreddit,
-            "timestamp": datetime.now(UTC)
-        })
+        # Upsert on the key: re-sending the same media refreshes its TTL
+        # instead of adding a second document
+        await sent_media_col.update_one(
+            {"_id": key},
+            {"$set": {"url": url, "post_id": post_id, "subreddit": subreddit, "timestamp": datetime.now(UTC)}},
+            upsert=True
+        )
     except Exception as e:
         print(f"Error marking media as sent: {e}")
 
+async def sent_media_report(query) -> str:
+    """Index sizes of sent_media plus the latency of a sample of lookups."""
+    try:
+        stats = await sent_media_col.stats()
+        sizes = ", ".join(f"{name} {size / 1024:.0f} KiB" for name, size in stats.get("indexSizes", {}).items())
+    except Exception:
+        sizes = "unavailable"
+    sample = await sent_media_col.find({}, {"url": 1}, limit=50)
+    started = time.perf_counter()
+    await asyncio.gather(*(sent_media_col.find_one(query(doc)) for doc in sample))
+    elapsed = (time.perf_counter() - started) * 1000
+    return f"indexes: {sizes}; {len(sample)} lookups in {elapsed:.1f}ms"
+
+async def migrate_sent_media():
+    """Re-key documents from the old url-indexed layout onto hashed _ids."""
+    legacy = {"_id": {"$type": "objectId"}}
+    if not await sent_media_col.count_documents(legacy, limit=1):
+        return 0
+    print(f"sent_media before migration: {await sent_media_report(lambda doc: {'url': doc['url']})}")
+    migrated = 0
+    while True:
+        docs = await sent_media_col.find(legacy, limit=1000)
+        if not docs:
+            break
+        ops = []
+        for doc in docs:
+            # Variants of one URL collapse into a single document; keep the
+            # newest timestamp so it expires no earlier than before
+            ops.append(UpdateOne(
+                {"_id": media_key(doc["url"])},
+                {
+                    "$max": {"timestamp": doc["timestamp"]},
+                    "$setOnInsert": {"url": doc["url"], "post_id": doc.get("post_id"), "subreddit": doc.get("subreddit")}
+                },
+                upsert=True
+            ))
+            ops.append(DeleteOne({"_id": doc["_id"]}))
+        await sent_media_col.bulk_write(ops, ordered=True)
+        migrated += len(docs)
+    if "url_1" in await sent_media_col.index_information():
+        await sent_media_col.drop_index("url_1")
+    print(f"Migrated {migrated} sent_media documents to hashed keys")
+    print(f"sent_media after migration: {await sent_media_report(lambda doc: {'_id': doc['_id']})}")
+    return migrated
+
 # Initialize MongoDB collections and indexes
 async def init_mongodb():
     """Initialize MongoDB collections and indexes"""
     try:
         # Create TTL index for sent_media if it doesn't exist
-        if "timestamp_1" not in sent_media_col.index_information():
-            sent_media_col.create_index("timestamp", expireAfterSeconds=7 * 24 * 60 * 60)
+        if "timestamp_1" not in await sent_media_col.index_information():
+            await sent_media_col.create_index("timestamp", expireAfterSeconds=SENT_MEDIA_TTL_DAYS * 24 * 60 * 60)
             print("Created TTL index for sent_media collection")
             
         # Create indexes for faster lookups
-        config_col.create_index("channel_id", unique=True)
-        sent_media_col.create_index("url")
-        stats_col.create_index("type")
+        await config_col.create_index("channel_id", unique=True)
+        await migrate_sent_media()
+        await stats_col.create_index("type")
+        await stats_col.create_index([("type", 1), ("channel_id", 1)])
+        
+        await stats_col.create_index([("type", 1), ("subreddit", 1)])
+        cursors = await listing_cursors.load()
+        print(f"Recovered listing cursors for {cursors} subreddits")
+        rotations = await rotation.load()
+        print(f"Recovered subreddit rotation for {rotations} channels")
+        
+        # Warm the dedup filter from the live collection
+        warmed = await sent_media_filter.warm(sent_media_col)
+        print(f"Loaded {warmed} sent media URLs into dedup filter")
         
         # Initialize or recover LAST_SENT from MongoDB
         global LAST_SENT
-        stored_times = stats_col.find_one({"type": "last_sent"})
+        stored_times = await last_sent_store.load()
         if stored_times:
-            LAST_SENT = {int(k): datetime.fromisoformat(v) for k, v in stored_times["data"].items()}
+            LAST_SENT = stored_times
             print(f"Recovered timing data for {len(LAST_SENT)} channels")
         
         # Validate existing configs
         invalid_channels = []
-        for cfg in config_col.find():
+        for cfg in await config_col.find():
             channel_id = cfg.get("channel_id")
             if not channel_id:
                 invalid_channels.append(cfg["_id"])
@@ -145,12 +313,15 @@ async def init_mongodb():
                 updates["last_post_time"] = datetime.min.replace(tzinfo=UTC)
                 
             if updates:
-                config_col.update_one({"_id": cfg["_id"]}, {"$set": updates})
+                await config_col.update_one({"_id": cfg["_id"]}, {"$set": updates})
         
         # Remove invalid configs
         if invalid_channels:
-            config_col.delete_many({"_id": {"$in": invalid_channels}})
+            await config_col.delete_many({"_id": {"$in": invalid_channels}})
             print(f"Removed {len(invalid_channels)} invalid channel configurations")
+        
+        loaded = await config_cache.load()
+        print(f"Loaded {loaded} channel configurations into cache")
             
         print("MongoDB initialization complete")
         return True
@@ -159,63 +330,79 @@ async def init_mongodb():
         print(f"Error initializing MongoDB: {e}")
         return False
 
-async def save_last_sent():
-    """Save LAST_SENT times to MongoDB"""
+def save_last_sent(channel_id: int):
+    """Queue a channel's LAST_SENT time for the next batched write"""
+    last_sent_store.mark(channel_id, LAST_SENT[channel_id])
+
+def update_channel_stats(channel_id: int, post_url: str, subreddit: str):
+    """Queue a channel posting statistics update for the next batched write"""
+    channel_stats.add(channel_id, post_url, subreddit, datetime.now(UTC))
+
+async def flush_write_behind():
+    """Write queued LAST_SENT times, channel stats, rotation and listing cursors to MongoDB"""
     try:
-        # Convert datetime objects to ISO format strings for MongoDB storage
-        data = {str(k): v.isoformat() for k, v in LAST_SENT.items()}
-        stats_col.update_one(
-            {"type": "last_sent"},
-            {"$set": {"data": data, "updated_at": datetime.now(UTC)}},
-            upsert=True
-        )
+        await last_sent_store.flush()
     except Exception as e:
         print(f"Error saving last sent times: {e}")
-
-async def update_channel_stats(channel_id: int, post_url: str, subreddit: str):
-    """Update channel posting statistics"""
     try:
-        stats_col.update_one(
-            {"type": "channel_stats", "channel_id": channel_id},
-            {
-                "$inc": {"total_posts": 1, f"subreddit_counts.{subreddit}": 1},
-                "$set": {"last_post_url": post_url, "last_post_time": datetime.now(UTC)}
-            },
-            upsert=True
-        )
+        await channel_stats.flush()
     except Exception as e:
         print(f"Error updating channel stats: {e}")
+    try:
+        await listing_cursors.flush()
+    except Exception as e:
+        print(f"Error saving listing cursors: {e}")
+    try:
+        await rotation.flush()
+    except Exception as e:
+        print(f"Error saving subreddit rotation: {e}")
 
 # ─── Reddit Client ──────────────────────────────────────────────────────────────
 # Global session variable
 session = None
 reddit = None
+REDDIT_AUTHENTICATED = False  # set by test_reddit_auth; /health also accepts recent API successes
+
+# Every OAuth request spends a token from this budget, which is refilled from
+# Reddit's X-Ratelimit headers; concurrent listing fetches are coalesced
+reddit_budget = RateBudget()
+listing_flight = SingleFlight()
+# Media picked by an in-flight fetch_post, so concurrent callers don't double post
+claimed_media = TTLCache(ttl=600, maxsize=10000)
+
+# Loaded subreddit handles, shared by fetch_post, verify_subreddit_access and
+# addsub so steady-state posting only spends API quota on listings
+subreddit_cache = TTLCache(
+    ttl=float(os.getenv("SUBREDDIT_CACHE_TTL", "3600")),
+    maxsize=int(os.getenv("SUBREDDIT_CACHE_SIZE", "512"))
+)
 
 @asynccontextmanager
 async def get_subreddit(name: str):
     """Safely get a subreddit with proper timeout handling."""
     if reddit is None:
         await setup_reddit()
+    key = name.lower()
     try:
-        # First check if we can access the subreddit at all
-        sub = await reddit.subreddit(name, fetch=True)
-        if not sub:
-            raise Exception("Could not access subreddit")
-            
-        # Force NSFW access
-        sub._fetched = True
-        sub.over18 = True
-        sub.nsfw = True
-        
-        # Try to load subreddit info
-        try:
-            await sub.load()
-        except Exception as e:
-            print(f"Warning: Could not load subreddit info: {e}")
-            # Continue anyway as we might still be able to access posts
+        sub = subreddit_cache.get(key)
+        if sub is None:
+            # First check if we can access the subreddit at all; fetch=True
+            # already loads the about data, so no separate load() is needed
+            with FETCH_STAGE_SECONDS.time(stage="subreddit_load"):
+                sub = await reddit.subreddit(name, fetch=True)
+            if not sub:
+                raise Exception("Could not access subreddit")
+                
+            # Force NSFW access
+            sub._fetched = True
+            sub.over18 = True
+            sub.nsfw = True
+            subreddit_cache.set(key, sub)
             
         yield sub
     except Exception as e:
+        # Don't keep handing out a handle that just failed
+        subreddit_cache.pop(key)
         print(f"Error accessing subreddit r/{name}: {e}")
         raise
 
@@ -236,16 +423,7 @@ async def verify_subreddit_access(sub_name: str):
                         posts_found = True
                         
                         # Check if it's a media post
-                        if (
-                            # Direct images
-                            any(post.url.lower().endswith(ext) for ext in [".jpg", ".jpeg", ".png", ".gif"]) or
-                            # Reddit videos
-                            (hasattr(post, 'media') and post.media and post.media.get("reddit_video")) or
-                            # Redgifs/Gfycat
-                            any(domain in post.url.lower() for domain in ["redgifs.com", "gfycat.com"]) or
-                            # Imgur
-                            "imgur.com" in post.url.lower()
-                        ):
+                        if classify(post.url, getattr(post, "media", None)):
                             media_found = True
                             print(f"Found media post: {post.url}")
                             print(f"- Type: {getattr(post, 'post_hint', 'unknown')}")
@@ -296,7 +474,8 @@ async def setup_reddit():
             username=REDDIT_USERNAME,
             password=REDDIT_PASSWORD,
             user_agent=USER_AGENT,
-            requestor_kwargs={"session": session}
+            requestor_class=BudgetRequestor,
+            requestor_kwargs={"session": session, "budget": reddit_budget}
         )
         
         # Enable NSFW content
@@ -306,138 +485,352 @@ async def setup_reddit():
             "risky_mode_enabled": True
         }
         
-        # Verify the account is configured for NSFW content
-        me = await reddit.user.me()
-        print("\nReddit account configuration:")
-        print(f"- Username: {me.name}")
-        print(f"- Over 18: {getattr(me, 'over_18', 'unknown')}")
-        print(f"- NSFW allowed: {getattr(me, 'nsfw_allowed', 'unknown')}")
-        
-        # Test NSFW access
-        test_sub = await reddit.subreddit("gonewild", fetch=True)  # Common NSFW sub for testing
-        if test_sub:
-            print("✅ NSFW access verified")
-        
+        # No network here: test_reddit_auth makes the one user.me() check
         print("Reddit client initialized with NSFW access enabled")
         
     except Exception as e:
         print(f"Error setting up Reddit client: {e}")
         raise
 
+async def fetch_listing(subreddit: str, limit: int = 50, before: str | None = None) -> list:
+    """Fetch a /new listing; concurrent callers for the same sub share one request.
+    
+    With before (a fullname) only submissions newer than it are returned."""
+    async def _fetch():
+        async with get_subreddit(subreddit) as sub:
+            print(f"\nFetching from r/{subreddit}" + (f" before {before}" if before else ""))
+            with FETCH_STAGE_SECONDS.time(stage="listing"):
+                if before:
+                    # A single request; the listing generator would go on to page
+                    # backwards with after= once the newer posts ran out
+                    listing = await reddit.get(f"r/{sub.display_name}/new", params={"limit": limit, "before": before})
+                    return list(listing)
+                return [post async for post in sub.new(limit=limit)]  # Use new for most recent posts
+    
+    return await listing_flight.run((subreddit.lower(), limit, before), _fetch)
+
+async def fetch_multireddit_listing(subreddits: list[str], limit: int = 100) -> list:
+    """Fetch one combined /new listing for several subreddits (r/a+b+c)."""
+    name = "+".join(sorted(sub.lower() for sub in subreddits))
+    
+    async def _fetch():
+        if reddit is None:
+            await setup_reddit()
+        # A multireddit has no about page, so it is never fetched or cached
+        multi = await reddit.subreddit(name)
+        print(f"\nFetching from r/{name}")
+        with FETCH_STAGE_SECONDS.time(stage="listing"):
+            return [post async for post in multi.new(limit=limit)]
+    
+    return await listing_flight.run((name, limit), _fetch)
+
+async def select_candidates(listing: list, max_per_sub: int = 10) -> dict[str, list[Candidate]]:
+    """Dedup and classify a listing into unsent candidates per (lower-cased) subreddit.
+    
+    Keeps the oldest max_per_sub per sub, so advance_cursor can stop at the
+    newest one kept and the rest are still newer than the cursor next time."""
+    valid_posts = {}
+    seen_urls = set()
+    candidates = []
+    
+    # Drop stickies, self posts and repeated URLs before the single dedup query
+    for post in listing:
+        try:
+            if post.stickied or post.is_self:
+                continue
+                
+            # Skip if we've seen this URL before
+            if post.url in seen_urls:
+                continue
+            seen_urls.add(post.url)
+            candidates.append(post)
+        except Exception as post_error:
+            print(f"Error processing post: {post_error}")
+            continue
+    
+    # Skip anything whose media was sent in the last week
+    already_sent = await get_sent_media([post.url for post in candidates])
+    
+    classify_time = 0.0
+    for post in sorted(candidates, key=lambda post: post.created_utc):
+        try:
+            if post.url in already_sent:
+                continue
+            
+            started = time.perf_counter()
+            media = classify(post.url, getattr(post, "media", None))
+            classify_time += time.perf_counter() - started
+            if media:
+                candidate = Candidate.from_submission(post, media)
+                found = valid_posts.setdefault(candidate.subreddit.lower(), [])
+                if len(found) < max_per_sub:
+                    print(f"✅ Valid {media.type} post found: {media.url}")
+                    found.append(candidate)
+        except Exception as post_error:
+            print(f"Error processing post: {post_error}")
+            continue
+    FETCH_STAGE_SECONDS.observe(classify_time, stage="classification")
+    
+    return valid_posts
+
+# Dry subs are skipped for a while and failing ones trip a circuit breaker,
+# so one bad subreddit can't eat a 30s fetch timeout every time it comes up
+subreddit_health = SubredditHealth(
+    empty_backoff=float(os.getenv("SUBREDDIT_EMPTY_BACKOFF", "300")),
+    failure_backoff=float(os.getenv("SUBREDDIT_FAILURE_BACKOFF", "60")),
+    max_backoff=float(os.getenv("SUBREDDIT_MAX_BACKOFF", "3600")),
+    threshold=int(os.getenv("SUBREDDIT_FAILURE_THRESHOLD", "3"))
+)
+
+def is_fatal_fetch_error(error: Exception) -> bool:
+    """Banned, private or missing: retrying the same subreddit won't help."""
+    return isinstance(error, (Forbidden, NotFound, Redirect, UnavailableForLegalReasons))
+
+def record_fetch_error(subreddit: str, error: Exception):
+    """Count a failed fetch; banned, private or missing subs trip the breaker at once."""
+    if isinstance(error, asyncio.TimeoutError):
+        subreddit_health.record_failure(subreddit, "timeout")
+    else:
+        subreddit_health.record_failure(subreddit, type(error).__name__, fatal=is_fatal_fetch_error(error))
+
+def pick_subreddit(channel_id: int, subs: list[str]) -> str | None:
+    """Next subreddit in the channel's rotation, skipping ones that are backed off."""
+    if not subs:
+        return None
+    sub = subreddit_health.pick(subs, rotation.start(channel_id, subs))
+    if sub:
+        rotation.mark(channel_id, sub)
+    return sub
+
+# How often a subreddit with nothing new may re-read its full listing
+LISTING_BACKFILL_INTERVAL = float(os.getenv("LISTING_BACKFILL_INTERVAL", "1800"))
+last_backfill = {}  # subreddit -> monotonic time of last backfill
+
+def advance_cursor(subreddit: str, listing: list, kept: list[Candidate], max_per_sub: int, reset: bool = False):
+    """Move a subreddit's high-water mark past what select_candidates consumed.
+    
+    That is the newest post in listing, unless the sub hit max_per_sub: then
+    only up to the newest candidate kept, so the unsent posts left over are
+    still newer than the cursor on the next fetch."""
+    if len(kept) >= max_per_sub:
+        newest = max(kept, key=lambda candidate: candidate.created_utc)
+        fullname = f"t3_{newest.id}"
+    else:
+        posts = [post for post in listing if str(post.subreddit).lower() == subreddit]
+        if not posts:
+            return
+        newest = max(posts, key=lambda post: post.created_utc)
+        fullname = newest.fullname
+    if reset:
+        listing_cursors.reset(subreddit, fullname, newest.created_utc)
+    else:
+        listing_cursors.advance(subreddit, fullname, newest.created_utc)
+
+def backfill_due(subreddit: str) -> bool:
+    """Whether a dry subreddit may re-read its full /new listing yet."""
+    return time.monotonic() - last_backfill.get(subreddit, float("-inf")) >= LISTING_BACKFILL_INTERVAL
+
+async def fetch_candidates(subreddit: str, max_candidates: int = 10) -> list[Candidate]:
+    """Fetch unsent media posts from the subreddit, without marking any as sent."""
+    key = subreddit.lower()
+    cursor = listing_cursors.get(key)
+    
+    # Steady state: only ask for posts newer than the last one we saw
+    listing = await fetch_listing(subreddit, before=cursor[0] if cursor else None)
+    valid_posts = (await select_candidates(listing, max_candidates)).get(key, [])
+    advance_cursor(key, listing, valid_posts, max_candidates)
+    
+    # Nothing new: occasionally re-read the full listing. This also recovers
+    # from a cursor whose post was deleted, which makes before= return nothing.
+    if cursor and not valid_posts and backfill_due(key):
+        last_backfill[key] = time.monotonic()
+        listing = await fetch_listing(subreddit)
+        valid_posts = (await select_candidates(listing, max_candidates)).get(key, [])
+        advance_cursor(key, listing, valid_posts, max_candidates, reset=True)
+    
+    print(f"\nProcessed {len(listing)} posts total")
+    print(f"Found {len(valid_posts)} valid media posts")
+    if not valid_posts:
+        print(f"No valid posts found in r/{subreddit} (checked {len(listing)} posts)")
+    return valid_posts
+
+# Subreddits per combined r/a+b+c listing request
+MULTIREDDIT_GROUP_SIZE = int(os.getenv("MULTIREDDIT_GROUP_SIZE", "10"))
+
+async def fetch_candidates_batch(subreddits: list[str], max_per_sub: int = 10) -> dict[str, list[Candidate]]:
+    """Fetch candidates for many subreddits, one multireddit listing per group.
+    
+    Subs a group's listing leaves dry share one more combined backfill listing.
+    A listing that comes back full may have crowded quiet subs out entirely;
+    those are fetched on their own rather than taken for dry."""
+    subs = sorted({sub.lower() for sub in subreddits})
+    groups = [subs[i:i + MULTIREDDIT_GROUP_SIZE] for i in range(0, len(subs), MULTIREDDIT_GROUP_SIZE)]
+    
+    def _crowded_out(subs, listing, limit):
+        # A short listing holds everything the subs have; a full one says
+        # nothing about subs that don't appear in it
+        if len(listing) < limit:
+            return []
+        present = {str(post.subreddit).lower() for post in listing}
+        return [sub for sub in subs if sub not in present]
+    
+    async def _backfill(dry):
+        # One full re-read shared by all dry subs of a group, like the one
+        # fetch_candidates does for a single sub
+        now = time.monotonic()
+        for sub in dry:
+            last_backfill[sub] = now
+        limit = min(100, 25 * len(dry))
+        listing = await fetch_multireddit_listing(dry, limit=limit) if len(dry) > 1 else []
+        crowded = _crowded_out(dry, listing, limit) if len(dry) > 1 else dry
+        found = await select_candidates(listing, max_per_sub)
+        for sub in dry:
+            if sub not in crowded:
+                advance_cursor(sub, listing, found.get(sub, []), max_per_sub, reset=True)
+        for sub, own in zip(crowded, await asyncio.gather(*(fetch_listing(sub) for sub in crowded))):
+            found[sub] = (await select_candidates(own, max_per_sub)).get(sub, [])
+            advance_cursor(sub, own, found[sub], max_per_sub, reset=True)
+        return found
+    
+    async def _fetch_group(group):
+        if len(group) == 1:
+            return {group[0]: await fetch_candidates(group[0], max_per_sub)}
+        # Busy subs can crowd quiet ones out of a shared listing, so ask
+        # for more posts the more subs share it
+        limit = min(100, 25 * len(group))
+        listing = await fetch_multireddit_listing(group, limit=limit)
+        crowded = _crowded_out(group, listing, limit)
+        # A combined listing can't take a before= cursor, so skip what
+        # each sub's high-water mark says we've already processed
+        fresh = []
+        for post in listing:
+            cursor = listing_cursors.get(str(post.subreddit).lower())
+            if cursor is None or post.created_utc > cursor[1]:
+                fresh.append(post)
+        found = await select_candidates(fresh, max_per_sub)
+        for sub in group:
+            advance_cursor(sub, listing, found.get(sub, []), max_per_sub)
+        # Dry subs share one backfill request, however many there are
+        dry = [sub for sub in group if sub not in crowded and not found.get(sub) and backfill_due(sub)]
+        if dry:
+            backfilled = await _backfill(dry)
+            for sub in dry:
+                found[sub] = backfilled.get(sub, [])
+        # Crowded-out subs weren't seen at all, so they get their own fetch
+        for sub, own in zip(crowded, await asyncio.gather(*(fetch_candidates(sub, max_per_sub) for sub in crowded))):
+            found[sub] = own
+        # Every sub of the group gets a key, so callers can tell dry from failed
+        return {sub: found.get(sub, []) for sub in group}
+    
+    async def _group(group):
+        try:
+            # The timeout covers the dry-sub backfill as well
+            return await asyncio.wait_for(_fetch_group(group), timeout=30.0)
+        except asyncio.TimeoutError as e:
+            print(f"Timeout fetching posts from r/{'+'.join(group)}")
+            for sub in group:
+                record_fetch_error(sub, e)
+        except Exception as e:
+            if is_fatal_fetch_error(e) and len(group) > 1:
+                # One banned or private sub fails the whole multireddit; split
+                # the group until the breaker can open for just that sub
+                print(f"r/{'+'.join(group)} refused ({type(e).__name__}), splitting the group")
+                middle = len(group) // 2
+                halves = await asyncio.gather(_group(group[:middle]), _group(group[middle:]))
+                return {sub: found for half in halves for sub, found in half.items()}
+            print(f"Error fetching posts from r/{'+'.join(group)}: {e}")
+            for sub in group:
+                record_fetch_error(sub, e)
+        return {}
+    
+    # Subs of a failed group are left out, so callers can tell them from dry ones
+    results = {}
+    for found in await asyncio.gather(*(_group(group) for group in groups)):
+        results.update(found)
+    return results
+
+async def refill_candidates(subreddits: list[str]) -> dict[str, list[Candidate]]:
+    """Background refill for the candidate pool, skipping backed-off subreddits."""
+    healthy = [sub for sub in subreddits if subreddit_health.available(sub)]
+    results = await fetch_candidates_batch(healthy, max_per_sub=candidate_pool.high) if healthy else {}
+    for sub in healthy:
+        key = sub.lower()
+        if key not in results:
+            continue  # the group failed and was already counted
+        if results[key]:
+            subreddit_health.record_success(key)
+        elif not candidate_pool.depth(sub):
+            subreddit_health.record_empty(key)
+    return results
+
+# Prefetched candidates per subreddit, topped up in the background so posting
+# only falls back to a live fetch when a pool has run dry
+candidate_pool = CandidatePool(
+    refill_candidates,
+    low=int(os.getenv("POOL_LOW_WATERMARK", "3")),
+    high=int(os.getenv("POOL_HIGH_WATERMARK", "10")),
+    max_age=float(os.getenv("POOL_MAX_AGE", "3600")),
+    batch_size=MULTIREDDIT_GROUP_SIZE
+)
+
+def claim_post(post) -> bool:
+    """Reserve a post's media for one caller; False if someone else has it."""
+    if post.url in claimed_media:
+        return False
+    claimed_media.set(post.url, True)
+    return True
+
 async def fetch_post(subreddit: str):
     """Fetch a media post from the subreddit with variety."""
+    started = time.perf_counter()
+    source = "pool"
     try:
-        async def _fetch():
-            async with get_subreddit(subreddit) as sub:
-                print(f"\nFetching from r/{subreddit}")
-                
-                # Get the appropriate listing
-                listing = sub.new(limit=50)  # Use new for most recent posts
-                
-                valid_posts = []
-                seen_urls = set()
-                processed_count = 0
-                
-                async for post in listing:
-                    processed_count += 1
-                    try:
-                        if post.stickied or post.is_self:
-                            continue
-                            
-                        # Skip if we've seen this URL before
-                        if post.url in seen_urls:
-                            continue
-                        seen_urls.add(post.url)
-                        
-                        # Skip if this media was sent in the last week
-                        if await is_media_sent(post.url):
-                            continue
-                        
-                        print(f"\nChecking post: {post.url}")
-                        
-                        # Check for various media types
-                        is_valid = False
-                        media_type = "unknown"
-                        media_url = None
-                        
-                        # Direct image links
-                        if any(post.url.lower().endswith(ext) for ext in [".jpg", ".jpeg", ".png", ".gif"]):
-                            is_valid = True
-                            media_type = "direct_image"
-                            media_url = post.url
-                        
-                        # Reddit-hosted videos
-                        elif "v.redd.it" in post.url:
-                            if hasattr(post, 'media') and post.media and post.media.get("reddit_video"):
-                                video_data = post.media["reddit_video"]
-                                if video_data.get("fallback_url"):
-                                    is_valid = True
-                                    media_type = "reddit_video"
-                                    media_url = video_data["fallback_url"]
-                        
-                        # Redgifs links
-                        elif any(domain in post.url.lower() for domain in ["redgifs.com", "gfycat.com"]):
-                            is_valid = True
-                            media_type = "redgifs"
-                            media_url = post.url
-                        
-                        # Imgur links
-                        elif "imgur.com" in post.url.lower():
-                            # Convert imgur links to direct images if possible
-                            if not any(post.url.lower().endswith(ext) for ext in [".jpg", ".jpeg", ".png", ".gif"]):
-                                if "/a/" not in post.url:  # Not an album
-                                    media_url = post.url + ".jpg"
-                                else:
-                                    media_url = post.url
-                            else:
-                                media_url = post.url
-                            is_valid = True
-                            media_type = "imgur"
-                            
-                        if is_valid and media_url:
-                            print(f"✅ Valid {media_type} post found: {media_url}")
-                            post.media_url = media_url  # Store the media URL for later use
-                            post.media_type = media_type
-                            valid_posts.append(post)
-                            
-                            # If we have enough posts, randomly select one
-                            if len(valid_posts) >= 10:
-                                selected_post = valid_posts[datetime.now(UTC).microsecond % len(valid_posts)]
-                                await mark_media_sent(selected_post.media_url, selected_post.id, str(selected_post.subreddit))
-                                return selected_post
-                    except Exception as post_error:
-                        print(f"Error processing post: {post_error}")
-                        continue
-                
-                print(f"\nProcessed {processed_count} posts total")
-                print(f"Found {len(valid_posts)} valid media posts")
-                
-                # If we have any valid posts, randomly select one
-                if valid_posts:
-                    selected_post = valid_posts[datetime.now(UTC).microsecond % len(valid_posts)]
-                    await mark_media_sent(selected_post.media_url, selected_post.id, str(selected_post.subreddit))
-                    return selected_post
-                    
-                print(f"No valid posts found in r/{subreddit} (checked {len(seen_urls)} posts)")
+        # Serve from the prefetched pool when possible. Pooled posts are
+        # re-checked because another path may have sent the same media since.
+        post = candidate_pool.pop(subreddit)
+        while post is not None and (not claim_post(post) or await is_media_sent(post.url)):
+            post = candidate_pool.pop(subreddit)
+        
+        if post is None:
+            source = "live"
+            # Live single-sub fetch with a timeout; a pool that runs dry
+            # mid-burst (a /forcesend asking for more than the prefill holds)
+            # costs one listing here rather than a grouped one
+            print(f"\nStarting fetch from r/{subreddit}")
+            task = asyncio.create_task(fetch_candidates(subreddit))
+            valid_posts = await asyncio.wait_for(task, timeout=30.0)
+            if not valid_posts:
+                print(f"No media posts found in r/{subreddit}")
+                subreddit_health.record_empty(subreddit)
                 return None
-
-        # Create and run task with timeout
-        print(f"\nStarting fetch from r/{subreddit}")
-        task = asyncio.create_task(_fetch())
-        post = await asyncio.wait_for(task, timeout=30.0)
+            subreddit_health.record_success(subreddit)
+            
+            # Coalesced listings hand the same posts to concurrent callers,
+            # so only consider ones nobody else has claimed
+            valid_posts = [p for p in valid_posts if p.url not in claimed_media]
+            if not valid_posts:
+                print(f"No unclaimed media posts left in r/{subreddit}")
+                return None
+            
+            # Randomly select one and keep the rest for next time
+            post = valid_posts.pop(datetime.now(UTC).microsecond % len(valid_posts))
+            claim_post(post)
+            candidate_pool.add(subreddit, valid_posts)
         
-        if post:
-            print(f"Successfully fetched {post.media_type} post from r/{subreddit}: {post.media_url}")
-            return post
-        print(f"No media posts found in r/{subreddit}")
-        return None
+        await mark_media_sent(post.media_url, post.id, post.subreddit)
+        print(f"Successfully fetched {post.media_type} post from r/{subreddit}: {post.media_url}")
+        return post
         
-    except asyncio.TimeoutError:
+    except asyncio.TimeoutError as e:
         print(f"Timeout fetching posts from r/{subreddit}")
+        record_fetch_error(subreddit, e)
         return None
     except Exception as e:
         print(f"Error fetching post: {e}")
+        record_fetch_error(subreddit, e)
         return None
+    finally:
+        FETCH_POST_SECONDS.observe(time.perf_counter() - started, source=source)
 
 # Add a command to clear the sent media history
 @tree.command(
@@ -449,16 +842,151 @@ async def clearmediahistory(interaction: discord.Interaction):
         return await interaction.response.send_message("❌ This command is only available to the bot owner.", ephemeral=True)
     
     try:
-        result = sent_media_col.delete_many({})
+        result = await sent_media_col.delete_many({})
+        sent_media_filter.clear()
         await interaction.response.send_message(f"✅ Cleared {result.deleted_count} entries from media history.")
     except Exception as e:
         await interaction.response.send_message(f"❌ Error clearing media history: {e}", ephemeral=True)
         await send_error_dm(BOT_OWNER_ID, str(e))
 
+@tree.command(
+    name="dbstats",
+    description="Show MongoDB latency and event-loop lag under load (Admin only)"
+)
+@app_commands.describe(
+    queries="Concurrent lookups to issue while sampling loop lag (1-200)"
+)
+async def dbstats(interaction: discord.Interaction, queries: int = 50):
+    if not interaction.user.id == BOT_OWNER_ID:
+        return await interaction.response.send_message("❌ This command is only available to the bot owner.", ephemeral=True)
+
+    await interaction.response.defer(thinking=True, ephemeral=True)
+
+    try:
+        queries = max(1, min(queries, 200))
+
+        # Sample loop lag while a burst of lookups is in flight. With the
+        # executor the lag stays near zero; MONGO_INLINE=1 shows the difference.
+        async def _load():
+            await asyncio.gather(*(
+                sent_media_col.find_one({"_id": media_key(f"dbstats-probe-{i}")}) for i in range(queries)
+            ))
+
+        lag, _ = await asyncio.gather(measure_loop_lag(duration=2.0), _load())
+
+        msg = [
+            "🗄️ **MongoDB Stats**",
+            f"Mode: {mongo.mode}",
+            f"Loop lag under {queries} lookups: avg {lag['avg_ms']:.1f} ms, max {lag['max_ms']:.1f} ms",
+            "\nOps by collection:"
+        ]
+        for name, (count, total) in sorted(mongo.op_stats.items()):
+            msg.append(f"- {name}: {count} ops, avg {total / count * 1000:.1f} ms")
+        msg.append(
+            f"\nDedup filter: {sent_media_filter.negatives} answered in-process, "
+            f"{sent_media_filter.maybes} sent to Mongo"
+        )
+        msg.append(f"sent_media {await sent_media_report(lambda doc: {'_id': doc['_id']})}")
+        pending = channel_stats.stats()
+        msg.append(
+            f"Stats write-behind: {pending['pending_ops']} pending ops, {pending['flushes']} flushes, "
+            f"last {pending['last_flush_ms']:.1f} ms, max {pending['max_flush_ms']:.1f} ms"
+        )
+
+        await interaction.followup.send("\n".join(msg), ephemeral=True)
+    except Exception as e:
+        await interaction.followup.send(f"❌ Error collecting database stats: {e}", ephemeral=True)
+        await send_error_dm(BOT_OWNER_ID, str(e))
+
+@tree.command(
+    name="loopstats",
+    description="Show event-loop lag and recent blocking calls (Admin only)"
+)
+async def loopstats(interaction: discord.Interaction):
+    if not interaction.user.id == BOT_OWNER_ID:
+        return await interaction.response.send_message("❌ This command is only available to the bot owner.", ephemeral=True)
+    
+    try:
+        stats = loop_watchdog.stats()
+        msg = [
+            "⏱️ **Event Loop**",
+            f"Lag over {stats['samples']} samples: avg {stats['avg_ms']:.1f} ms, "
+            f"p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms",
+            f"Blocked past {stats['threshold_ms']:.0f} ms: {stats['slow_callbacks']} times"
+            + (" (asyncio debug on)" if ASYNCIO_DEBUG else "")
+        ]
+        for event in reversed(stats["recent"][-3:]):
+            when = datetime.fromtimestamp(event["at"], UTC).strftime("%H:%M:%S")
+            msg.append(f"\n{when} UTC, {event['blocked_ms']:.0f} ms ({event['source']}):")
+            # Innermost frames are the ones doing the blocking
+            msg.append("```\n" + "\n".join(event["stack"][-4:])[-700:] + "\n```")
+        
+        await interaction.response.send_message("\n".join(msg)[:2000], ephemeral=True)
+    except Exception as e:
+        await interaction.response.send_message(f"❌ Error fetching loop statistics: {e}", ephemeral=True)
+        await send_error_dm(BOT_OWNER_ID, str(e))
+
+@tree.command(
+    name="poolstats",
+    description="Show prefetched candidate pool statistics (Admin only)"
+)
+async def poolstats(interaction: discord.Interaction):
+    if not interaction.user.id == BOT_OWNER_ID:
+        return await interaction.response.send_message("❌ This command is only available to the bot owner.", ephemeral=True)
+    
+    try:
+        stats = candidate_pool.stats()
+        msg = [
+            "🧺 **Candidate Pool**",
+            f"Hits: {stats['hits']} | Misses: {stats['misses']} ({stats['hit_rate'] * 100:.1f}% hit rate)",
+            f"Refills: {stats['refills']} (errors: {stats['refill_errors']}, queued: {stats['queued']})",
+            f"Watermarks: low {candidate_pool.low} / high {candidate_pool.high}",
+            f"\nReady candidates: {stats['depth']}"
+        ]
+        for sub in sorted(candidate_pool.pools):
+            msg.append(f"- r/{sub}: {candidate_pool.depth(sub)}")
+        
+        unhealthy = subreddit_health.unhealthy()
+        msg.append(f"\nBacked-off subreddits: {len(unhealthy)} (picks skipped: {subreddit_health.skipped})")
+        for sub, (reason, left) in sorted(unhealthy.items()):
+            msg.append(f"- r/{sub}: {reason}, retry in {left / 60:.0f}m")
+        
+        await interaction.response.send_message("\n".join(msg), ephemeral=True)
+    except Exception as e:
+        await interaction.response.send_message(f"❌ Error fetching pool statistics: {e}", ephemeral=True)
+        await send_error_dm(BOT_OWNER_ID, str(e))
+
+@tree.command(
+    name="outboxstats",
+    description="Show Discord delivery queue statistics (Admin only)"
+)
+async def outboxstats(interaction: discord.Interaction):
+    if not interaction.user.id == BOT_OWNER_ID:
+        return await interaction.response.send_message("❌ This command is only available to the bot owner.", ephemeral=True)
+    
+    try:
+        stats = outbox.stats()
+        per_message = stats["embeds"] / stats["messages"] if stats["messages"] else 0.0
+        msg = [
+            "📤 **Outbox**",
+            f"Sent: {stats['messages']} messages / {stats['embeds']} embeds ({per_message:.1f} embeds per message)",
+            f"Rate: {stats['messages_per_sec']:.2f} msg/s over the last {outbox.window:.0f}s",
+            f"Queued: {stats['queue_depth']} embeds across {stats['active_channels']} channels",
+            f"Failed sends: {stats['failures']}"
+        ]
+        await interaction.response.send_message("\n".join(msg), ephemeral=True)
+    except Exception as e:
+        await interaction.response.send_message(f"❌ Error fetching outbox statistics: {e}", ephemeral=True)
+        await send_error_dm(BOT_OWNER_ID, str(e))
+
 # ─── Globals ────────────────────────────────────────────────────────────────────
 GLOBAL_POST_INTERVAL = 30  # default to 30 minutes
 LAST_SENT = {}
 
+# Per-channel send queues; embeds queued together go out as one message
+outbox = Outbox()
+outbox.on_send = lambda seconds, embeds: DISCORD_SEND_SECONDS.observe(seconds)
+
 # ─── Utility Functions ──────────────────────────────────────────────────────────
 async def send_error_dm(user_id: int, message: str):
     user = await bot.fetch_user(user_id)
@@ -469,9 +997,9 @@ def is_admin_or_mod(interaction: discord.Interaction):
     return interaction.user.guild_permissions.manage_guild
 
 def get_config(channel_id: int):
-    return config_col.find_one({"channel_id": channel_id}) or {}
+    return config_cache.get(channel_id)
 
-async def build_embed(post):
+async def build_embed(post: Candidate):
     """Build a rich embed for the post with enhanced media support."""
     try:
         embed = discord.Embed(
@@ -482,22 +1010,21 @@ async def build_embed(post):
             color=discord.Color.red()
         )
         
-        # Use the media_url we stored earlier
-        media_type = getattr(post, 'media_type', 'unknown')
-        media_url = getattr(post, 'media_url', post.url)
+        media_type = post.media_type
+        media_url = post.media_url
         
         print(f"Building embed for {media_type} post: {media_url}")
         
         if media_type == "reddit_video":
             # For Reddit videos, add both the video URL and a thumbnail
             embed.add_field(name="Video", value=media_url, inline=False)
-            if hasattr(post, 'thumbnail') and post.thumbnail != 'default':
+            if post.thumbnail:
                 embed.set_thumbnail(url=post.thumbnail)
                 
         elif media_type == "redgifs":
             # For Redgifs, add the URL and thumbnail if available
             embed.add_field(name="GIF", value=media_url, inline=False)
-            if hasattr(post, 'thumbnail') and post.thumbnail != 'default':
+            if post.thumbnail:
                 embed.set_thumbnail(url=post.thumbnail)
                 
         elif media_type in ["direct_image", "imgur"]:
@@ -561,9 +1088,14 @@ async def addsub(interaction: discord.Interaction, name: str):
                 ephemeral=True
             )
             
-        # Try to fetch a post to verify we can get media content
-        test_post = await fetch_post(name)
-        if test_post is None:
+        # Try to fetch posts to verify we can get media content; they seed the
+        # candidate pool instead of being marked as sent unseen
+        try:
+            test_posts = await asyncio.wait_for(fetch_candidates(name), timeout=30.0)
+        except Exception as fetch_error:
+            print(f"Error fetching test posts from r/{name}: {fetch_error}")
+            test_posts = []
+        if not test_posts:
             return await interaction.followup.send(
                 f"❌ Could not find any media posts in r/{name}.\n"
                 "Please verify:\n"
@@ -574,14 +1106,16 @@ async def addsub(interaction: discord.Interaction, name: str):
             )
             
         # Add to database
-        config_col.update_one(
-            {"channel_id": interaction.channel_id},
+        cfg = await config_cache.update(
+            interaction.channel_id,
             {"$addToSet": {"subs": name}, "$setOnInsert": {
                 "interval": GLOBAL_POST_INTERVAL,
                 "limit": 25
             }},
             upsert=True
         )
+        candidate_pool.add(name, test_posts)
+        schedule_channel(cfg)
         
         await interaction.followup.send(f"✅ Successfully added r/{name} to this channel!")
         
@@ -610,10 +1144,11 @@ async def removesub(interaction: discord.Interaction, name: str):
         name = name.strip().lower()
         if name.startswith('r/'):
             name = name[2:]
-        config_col.update_one(
-            {"channel_id": interaction.channel_id}, 
+        await config_cache.update(
+            interaction.channel_id, 
             {"$pull": {"subs": name}}
         )
+        reschedule_channel(interaction.channel_id)
         await interaction.response.send_message(f"🗑️ Removed r/{name} from this channel.")
     except Exception as e:
         await interaction.response.send_message(f"❌ Error removing subreddit: {e}", ephemeral=True)
@@ -659,10 +1194,11 @@ async def setinterval(interaction: discord.Interaction, minutes: int):
     try:
         if not 1 <= minutes <= 1440:
             return await interaction.response.send_message("❌ Interval must be between 1 and 1440 minutes.", ephemeral=True)
-        config_col.update_one(
-            {"channel_id": interaction.channel_id},
+        await config_cache.update(
+            interaction.channel_id,
             {"$set": {"interval": minutes}}
         )
+        reschedule_channel(interaction.channel_id)
         await interaction.response.send_message(f"⏱️ Interval set to {minutes} min.")
     except Exception as e:
         await interaction.response.send_message("❌ Error setting interval.", ephemeral=True)
@@ -689,6 +1225,7 @@ async def setglobalinterval(interaction: discord.Interaction, minutes: int):
             return await interaction.response.send_message("❌ Interval must be between 1 and 1440 minutes.", ephemeral=True)
         global GLOBAL_POST_INTERVAL
         GLOBAL_POST_INTERVAL = minutes
+        rebuild_schedule()
         await interaction.response.send_message(f"🌐 Global interval set to {minutes} min.")
     except Exception as e:
         await interaction.response.send_message("❌ Error setting global interval.", ephemeral=True)
@@ -707,7 +1244,9 @@ async def send(interaction: discord.Interaction):
         if not subs:
             return await interaction.followup.send("❌ No subreddits linked.")
         
-        sub = subs[datetime.now(UTC).second % len(subs)]
+        sub = pick_subreddit(interaction.channel_id, subs)
+        if not sub:
+            return await interaction.followup.send("⚠️ All linked subreddits are backed off after failing or running dry; try again later.")
         post = await fetch_post(sub)
         if not post:
             return await interaction.followup.send("⚠️ No valid post found.")
@@ -717,6 +1256,7 @@ async def send(interaction: discord.Interaction):
             return await interaction.followup.send("⚠️ Failed to create embed.")
             
         await interaction.followup.send(embed=embed)
+        POSTS_TOTAL.inc(path="send")
     except Exception as e:
         print(f"Error in send command: {e}")
         await interaction.followup.send("❌ Error sending post.", ephemeral=True)
@@ -745,70 +1285,318 @@ async def forcesend(interaction: discord.Interaction, count: int = 1):
         if not 1 <= count <= 5:
             return await interaction.followup.send("❌ Count must be between 1 and 5.", ephemeral=True)
         
-        success_count = 0
-        fail_count = 0
+        # Prefetch every linked subreddit through grouped multireddit listings
+        await candidate_pool.fill([sub for cfg in config_cache.all() for sub in cfg.get("subs", [])])
         
-        for cfg in config_col.find():
+        async def force_channel(cfg):
+            """Gather count posts for one channel and queue them as one batch."""
             channel = bot.get_channel(cfg["channel_id"])
             if not channel:
-                config_col.delete_one({"channel_id": cfg["channel_id"]})
-                continue
-                
+                await config_cache.delete(cfg["channel_id"])
+                return 0, 0
             if "subs" not in cfg or not cfg["subs"]:
-                continue
-                
+                return 0, 0
+            
+            embeds, failed = [], 0
             for _ in range(count):
                 try:
-                    sub = cfg["subs"][datetime.now(UTC).second % len(cfg["subs"])]
+                    sub = pick_subreddit(cfg["channel_id"], cfg["subs"])
+                    if not sub:
+                        break
                     post = await fetch_post(sub)
                     if post:
                         embed = await build_embed(post)
                         if embed:
-                            await channel.send(embed=embed)
-                            success_count += 1
+                            embeds.append(embed)
                 except Exception as e:
                     print(f"Error in forcesend for r/{sub}: {e}")
-                    fail_count += 1
-                    continue
+                    failed += 1
+            
+            # Queued together, the outbox packs these into a single message
+            results = await asyncio.gather(*(outbox.send(channel, embed) for embed in embeds), return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    print(f"Error in forcesend for channel {cfg['channel_id']}: {result}")
+            sent = sum(1 for result in results if not isinstance(result, Exception))
+            return sent, failed + len(results) - sent
+        
+        semaphore = asyncio.Semaphore(AUTO_POST_CONCURRENCY)
+        
+        async def run(cfg):
+            async with semaphore:
+                return await force_channel(cfg)
+        
+        started = time.monotonic()
+        messages_before = outbox.messages
+        results = await asyncio.gather(*(run(cfg) for cfg in config_cache.all()))
+        elapsed = time.monotonic() - started
+        success_count = sum(sent for sent, _ in results)
+        POSTS_TOTAL.inc(success_count, path="forcesend")
+        fail_count = sum(failed for _, failed in results)
+        messages = outbox.messages - messages_before
+        print(f"Force send: {success_count} posts in {messages} messages over {elapsed:.2f}s")
         
-        await interaction.followup.send(f"✅ Force send complete!\nSuccess: {success_count}\nFailed: {fail_count}")
+        await interaction.followup.send(
+            f"✅ Force send complete!\nSuccess: {success_count}\nFailed: {fail_count}\n"
+            f"Messages: {messages} in {elapsed:.1f}s ({messages / elapsed if elapsed else 0:.1f}/s)"
+        )
     except Exception as e:
         print(f"Error in forcesend command: {e}")
         await interaction.followup.send("❌ Error during force send.", ephemeral=True)
         await send_error_dm(BOT_OWNER_ID, str(e))
 
-# ─── Auto Poster Task ───────────────────────────────────────────────────────────
-@tasks.loop(minutes=1)
-async def auto_post_loop():
-    for cfg in config_col.find():
+# ─── Stream Engine ──────────────────────────────────────────────────────────────
+# STREAM_MODE=1 pushes new submissions into per-channel queues from long-lived
+# multireddit streams instead of waiting for listings to be polled. Channels
+# still only post when their interval comes due.
+STREAM_MODE = os.getenv("STREAM_MODE", "0") == "1"
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "10"))
+# Subreddits per stream; one stream covers everything unless there are more
+STREAM_GROUP_SIZE = int(os.getenv("STREAM_GROUP_SIZE", "100"))
+
+channel_queues = {}  # channel_id -> deque of Candidate
+stream_task = None
+_followers = {}  # subreddit -> channel ids following it
+_followers_version = -1
+
+def get_followers(subreddit: str) -> list[int]:
+    """Channels linked to a subreddit, rebuilt whenever the configs change."""
+    global _followers, _followers_version
+    if _followers_version != config_cache.version:
+        followers = {}
+        for cfg in config_cache.all():
+            for sub in cfg.get("subs", []):
+                followers.setdefault(sub, []).append(cfg["channel_id"])
+        _followers, _followers_version = followers, config_cache.version
+    return _followers.get(subreddit, [])
+
+def enqueue_candidate(candidate: Candidate):
+    """Hand a streamed candidate to the least-backlogged channel following its sub."""
+    sub = candidate.subreddit.lower()
+    followers = get_followers(sub)
+    if not followers:
+        return
+    channel_id = min(followers, key=lambda cid: len(channel_queues.get(cid, ())))
+    queue = channel_queues.setdefault(channel_id, deque())
+    if len(queue) < STREAM_QUEUE_SIZE:
+        queue.append(candidate)
+    else:
+        # Every follower is backed up; keep it for whoever polls this sub next
+        candidate_pool.add(sub, [candidate])
+
+async def pop_channel_queue(channel_id: int):
+    """Next streamed candidate for a channel that nobody else has claimed or sent.
+    
+    Candidates can sit queued longer than claimed_media remembers them, so the
+    sent check is repeated here rather than trusted from enqueue time."""
+    queue = channel_queues.get(channel_id)
+    while queue:
+        candidate = queue.popleft()
+        if claim_post(candidate) and not await is_media_sent(candidate.media_url):
+            return candidate
+    return None
+
+async def handle_streamed_post(post):
+    try:
+        if post.stickied or post.is_self:
+            return
+        media = classify(post.url, getattr(post, "media", None))
+        if not media or await is_media_sent(post.url):
+            return
+        candidate = Candidate.from_submission(post, media)
+        listing_cursors.advance(candidate.subreddit.lower(), post.fullname, post.created_utc)
+        enqueue_candidate(candidate)
+    except Exception as e:
+        print(f"Error handling streamed post: {e}")
+
+def streamed_subreddits() -> list[str]:
+    """Every subreddit linked to some channel, in a stable order."""
+    return sorted({sub for cfg in config_cache.all() for sub in cfg.get("subs", [])})
+
+async def stream_group(subs: list[str], streamed: list[str]):
+    """Stream one multireddit until the set of linked subreddits changes.
+    
+    Restarting skips whatever was submitted in between, so config changes
+    that leave the subreddits alone (intervals, removed channels) don't."""
+    multi = await reddit.subreddit("+".join(subs))
+    print(f"Streaming submissions from {len(subs)} subreddits")
+    version = config_cache.version
+    # pause_after=0 yields None after every poll with nothing new, which is
+    # where we check whether the set of subreddits has changed
+    async for post in multi.stream.submissions(skip_existing=True, pause_after=0):
+        if post is None:
+            if config_cache.version != version:
+                version = config_cache.version
+                if streamed_subreddits() != streamed:
+                    return
+            continue
+        await handle_streamed_post(post)
+
+async def stream_submissions():
+    """Keep streams running over every configured subreddit."""
+    while True:
         try:
-            channel_id = cfg["channel_id"]
-            interval = cfg.get("interval", GLOBAL_POST_INTERVAL)
-            last_time = LAST_SENT.get(channel_id, datetime.min.replace(tzinfo=UTC))
-            
-            if datetime.now(UTC) - last_time < timedelta(minutes=interval):
+            if reddit is None:
+                await setup_reddit()
+            subs = streamed_subreddits()
+            if not subs:
+                await asyncio.sleep(30)
                 continue
-                
-            channel = bot.get_channel(channel_id)
-            if not channel:
-                config_col.delete_one({"channel_id": channel_id})
-                continue
-                
-            if not cfg.get("subs"):
-                continue
-                
-            sub = cfg["subs"][datetime.now(UTC).second % len(cfg["subs"])]
-            post = await fetch_post(sub)
-            if post:
-                embed = await build_embed(post)
-                if embed:
-                    await channel.send(embed=embed)
-                    LAST_SENT[channel_id] = datetime.now(UTC)
-                    await save_last_sent()
-                    await update_channel_stats(channel_id, post.url, str(post.subreddit))
+            groups = [subs[i:i + STREAM_GROUP_SIZE] for i in range(0, len(subs), STREAM_GROUP_SIZE)]
+            await asyncio.gather(*(stream_group(group, subs) for group in groups))
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"Error in auto_post_loop: {e}")
+            print(f"Error in submission stream: {e}")
+            await asyncio.sleep(30)
+
+# ─── Auto Poster Task ───────────────────────────────────────────────────────────
+# How many due channels are fetched/sent at once per tick
+AUTO_POST_CONCURRENCY = int(os.getenv("AUTO_POST_CONCURRENCY", "10"))
+# How long to wait before retrying a channel whose fetch came back empty
+AUTO_POST_RETRY = 60
+# Timing of the most recent auto_post_loop tick
+LAST_TICK = {"started_at": None, "duration": 0.0, "due": 0, "posted": 0}
+
+# Next post time per channel; the poster sleeps until the earliest one
+post_scheduler = DueScheduler()
+
+def schedule_channel(cfg):
+    """(Re)schedule a channel from its config and last post time."""
+    channel_id = cfg["channel_id"]
+    if not cfg.get("subs"):
+        post_scheduler.remove(channel_id)
+        return
+    interval = cfg.get("interval", GLOBAL_POST_INTERVAL)
+    last_time = LAST_SENT.get(channel_id, datetime.min.replace(tzinfo=UTC))
+    if last_time == datetime.min.replace(tzinfo=UTC):
+        post_scheduler.schedule(channel_id, time.time())
+    else:
+        post_scheduler.schedule(channel_id, (last_time + timedelta(minutes=interval)).timestamp())
+
+def rebuild_schedule():
+    """Schedule every configured channel from scratch (startup and global changes)."""
+    post_scheduler.clear()
+    for cfg in config_cache.all():
+        schedule_channel(cfg)
+    print(f"Scheduled {len(post_scheduler)} channels for auto posting")
+
+def reschedule_channel(channel_id: int):
+    """Reschedule one channel after its config changed."""
+    cfg = get_config(channel_id)
+    if cfg:
+        schedule_channel(cfg)
+    else:
+        post_scheduler.remove(channel_id)
+
+async def auto_post_channel(cfg, sub: str | None) -> bool:
+    """Post one item to a due channel. Returns True if something was sent.
+    
+    Streamed candidates queued for the channel go first. sub is None when the
+    channel had a queue (no subreddit was picked) or when every subreddit of
+    the channel is backed off."""
+    try:
+        channel_id = cfg["channel_id"]
+        channel = bot.get_channel(channel_id)
+        if not channel:
+            await config_cache.delete(channel_id)
+            return False
+            
+        queued = bool(channel_queues.get(channel_id))
+        post = await pop_channel_queue(channel_id)
+        if post:
+            await mark_media_sent(post.media_url, post.id, post.subreddit)
+        else:
+            if queued:
+                # Everything queued was stale; fall back to the rotation now
+                sub = pick_subreddit(channel_id, cfg["subs"])
+            if sub:
+                post = await fetch_post(sub)
+        if post:
+            embed = await build_embed(post)
+            if embed:
+                await outbox.send(channel, embed)
+                POSTS_TOTAL.inc(path="auto")
+                LAST_SENT[channel_id] = datetime.now(UTC)
+                save_last_sent(channel_id)
+                update_channel_stats(channel_id, post.url, post.subreddit)
+                return True
+    except Exception as e:
+        print(f"Error in auto_post_loop: {e}")
+    return False
+
+@tasks.loop()
+async def auto_post_loop():
+    # Sleep until the earliest channel is due; cost scales with posts sent,
+    # not with the number of configured channels
+    await post_scheduler.wait()
+    
+    started = time.perf_counter()
+    LAST_TICK["started_at"] = datetime.now(UTC)
+    
+    due_ids = post_scheduler.pop_due()
+    if not due_ids:
+        return
+    due = [cfg for cfg in map(get_config, due_ids) if cfg.get("subs")]
+    # Channels with streamed candidates queued don't touch their rotation
+    picks = [
+        None if channel_queues.get(cfg["channel_id"]) else pick_subreddit(cfg["channel_id"], cfg["subs"])
+        for cfg in due
+    ]
+    
+    # Fill every empty pool the due channels need with multireddit listings,
+    # so API calls scale with distinct subreddit groups rather than channels
+    await candidate_pool.fill([sub for sub in picks if sub])
+    
+    # Fan out across due channels, bounded so a big backlog can't flood
+    # Reddit or Discord at once
+    semaphore = asyncio.Semaphore(AUTO_POST_CONCURRENCY)
+    
+    async def _bounded(cfg, sub):
+        async with semaphore:
+            return await auto_post_channel(cfg, sub)
+    
+    results = await asyncio.gather(*(_bounded(cfg, sub) for cfg, sub in zip(due, picks)))
+    
+    for cfg, posted in zip(due, results):
+        channel_id = cfg["channel_id"]
+        # Skip channels a command already rescheduled meanwhile, or that are gone
+        if channel_id in post_scheduler or not bot.get_channel(channel_id):
             continue
+        if posted:
+            schedule_channel(cfg)
+        else:
+            post_scheduler.schedule(channel_id, time.time() + AUTO_POST_RETRY)
+    
+    duration = time.perf_counter() - started
+    TICK_SECONDS.observe(duration)
+    LAST_TICK.update(duration=duration, due=len(due), posted=sum(results))
+    print(f"Auto post tick: {sum(results)}/{len(due)} due channels posted in {duration:.2f}s")
+
+@auto_post_loop.before_loop
+async def before_auto_post_loop():
+    rebuild_schedule()
+
+@tasks.loop(seconds=CONFIG_REFRESH_INTERVAL)
+async def config_refresh_loop():
+    """Pick up config edits made directly in Mongo and reschedule those channels."""
+    try:
+        changed = await config_cache.refresh()
+        for channel_id in changed:
+            reschedule_channel(channel_id)
+        if changed:
+            print(f"Config refresh: {len(changed)} channels changed outside the bot")
+    except Exception as e:
+        print(f"Error refreshing config cache: {e}")
+
+@tasks.loop(seconds=WRITE_BEHIND_FLUSH_INTERVAL)
+async def write_behind_flush_loop():
+    await flush_write_behind()
+
+@config_refresh_loop.before_loop
+async def before_config_refresh_loop():
+    # init_mongodb has just loaded the cache
+    await asyncio.sleep(CONFIG_REFRESH_INTERVAL)
 
 @tree.command(
     name="channelstats",
@@ -816,7 +1604,8 @@ async def auto_post_loop():
 )
 async def channelstats(interaction: discord.Interaction):
     try:
-        stats = stats_col.find_one({"type": "channel_stats", "channel_id": interaction.channel_id})
+        stored = await stats_col.find_one({"type": "channel_stats", "channel_id": interaction.channel_id})
+        stats = channel_stats.merged(interaction.channel_id, stored)
         if not stats:
             return await interaction.response.send_message("No statistics available for this channel yet.")
             
@@ -843,54 +1632,137 @@ async def channelstats(interaction: discord.Interaction):
         await interaction.response.send_message(f"❌ Error fetching statistics: {e}", ephemeral=True)
         await send_error_dm(BOT_OWNER_ID, str(e))
 
+# ─── Startup ────────────────────────────────────────────────────────────────────
+# on_ready fires again after every gateway reconnect that can't resume, so each
+# phase records itself here once it succeeds and is never repeated. Phases
+# that failed are retried on the next on_ready until all of them have run.
+STARTUP_PHASES = ("mongo", "reddit", "commands", "tasks")
+STARTUP_DONE = set()
+startup_lock = asyncio.Lock()
+# Sync slash commands even if the stored command tree hash matches
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "").lower() in ("1", "true", "yes")
+
+async def run_phase(name: str, phase) -> bool:
+    """Run a startup phase once per process, logging how long it took."""
+    if name in STARTUP_DONE:
+        return True
+    started = time.perf_counter()
+    try:
+        ok = bool(await phase())
+    except Exception as e:
+        print(f"Startup phase {name} raised: {e}")
+        ok = False
+    print(f"Startup phase {name}: {'ok' if ok else 'FAILED'} in {time.perf_counter() - started:.2f}s")
+    if ok:
+        STARTUP_DONE.add(name)
+    return ok
+
+def command_tree_hash() -> str:
+    """Hash of the slash command definitions as they would be sent to Discord."""
+    commands_payload = sorted((cmd.to_dict() for cmd in tree.get_commands()), key=lambda cmd: cmd["name"])
+    payload = json.dumps({"guild": GUILD_ID, "commands": commands_payload}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+async def sync_commands() -> bool:
+    """Sync globally and to the home guild, unless the tree hasn't changed since the last sync."""
+    digest = command_tree_hash()
+    try:
+        stored = await stats_col.find_one({"type": "command_hash"})
+    except Exception as e:
+        print(f"Couldn't read stored command hash, syncing anyway: {e}")
+        stored = None
+    if stored and stored.get("hash") == digest and not FORCE_COMMAND_SYNC:
+        print("Command tree unchanged, skipping sync")
+        return True
+    
+    print("Syncing commands...")
+    # First sync globally
+    await tree.sync()
+    print("Global commands synced")
+    
+    # Then sync to specific guild for instant updates
+    guild = discord.Object(id=GUILD_ID)
+    tree.copy_global_to(guild=guild)
+    await tree.sync(guild=guild)
+    print("Guild commands synced")
+    
+    try:
+        await stats_col.update_one(
+            {"type": "command_hash"},
+            {"$set": {"hash": digest, "synced_at": datetime.now(UTC)}},
+            upsert=True
+        )
+    except Exception as e:
+        print(f"Couldn't store command hash: {e}")
+    return True
+
+async def start_background_tasks() -> bool:
+    """Start the pool refiller, stream and loops; needs MongoDB (configs) to be loaded."""
+    global stream_task
+    # Start the candidate refiller and prime a pool for every linked sub
+    candidate_pool.start()
+    for cfg in config_cache.all():
+        for sub in cfg.get("subs", []):
+            candidate_pool.request_refill(sub)
+    
+    if STREAM_MODE:
+        if stream_task is None or stream_task.done():
+            stream_task = asyncio.create_task(stream_submissions())
+    
+    # Start auto posting
+    for loop in (auto_post_loop, config_refresh_loop, write_behind_flush_loop):
+        if not loop.is_running():
+            loop.start()
+    return True
+
+async def startup() -> tuple[bool, bool]:
+    """Mongo init, Reddit auth and command sync run concurrently; returns (mongo_ok, reddit_ok)."""
+    mongo_ok, reddit_ok, _ = await asyncio.gather(
+        run_phase("mongo", init_mongodb),
+        run_phase("reddit", test_reddit_auth),
+        run_phase("commands", sync_commands),
+    )
+    if not mongo_ok:
+        print("WARNING: MongoDB initialization failed!")
+        return mongo_ok, reddit_ok
+    if not reddit_ok:
+        print("WARNING: Reddit authentication test failed!")
+    await run_phase("tasks", start_background_tasks)
+    return mongo_ok, reddit_ok
+
 # ─── Bot Events ─────────────────────────────────────────────────────────────────
 @bot.event
 async def on_ready():
+    logging_channel = None
     try:
-        print(f"Bot starting up as {bot.user.name}")
-        
-        # Initialize MongoDB
-        if not await init_mongodb():
-            print("WARNING: MongoDB initialization failed!")
-            return
-        
-        # Setup Reddit client
-        await setup_reddit()
-        
-        # Test Reddit auth
-        auth_success = await test_reddit_auth()
-        if not auth_success:
-            print("WARNING: Reddit authentication test failed!")
-        
-        try:
-            print("Syncing commands...")
-            # First sync globally
-            await tree.sync()
-            print("Global commands synced")
+        async with startup_lock:
+            pending = [phase for phase in STARTUP_PHASES if phase not in STARTUP_DONE]
+            if not pending:
+                print(f"Gateway reconnected as {bot.user.name}; startup already done")
+                return
             
-            # Then sync to specific guild for instant updates
-            guild = discord.Object(id=GUILD_ID)
-            tree.copy_global_to(guild=guild)
-            await tree.sync(guild=guild)
-            print("Guild commands synced")
-        except Exception as sync_error:
-            print(f"Error syncing commands: {sync_error}")
-        
-        # Start auto posting
-        auto_post_loop.start()
-        
-    logging_channel = bot.get_channel(LOGGING_CHANNEL_ID)
-    if logging_channel:
-        status = "✅" if auth_success else "⚠️"
-        await logging_channel.send(
-            f"{status} Bot restarted at {datetime.now(UTC)}\n"
-            f"Reddit auth test: {'Success' if auth_success else 'Failed'}\n"
-            f"MongoDB status: {'Initialized' if await init_mongodb() else 'Failed'}"
-        )
-        print("Bot is ready!")
+            if STARTUP_DONE:
+                print(f"Gateway reconnected as {bot.user.name}; retrying startup phases: {', '.join(pending)}")
+            else:
+                print(f"Bot starting up as {bot.user.name}")
+            started = time.perf_counter()
+            mongo_ok, reddit_ok = await startup()
+            elapsed = time.perf_counter() - started
+            print(f"Startup finished in {elapsed:.2f}s")
+        
+        logging_channel = bot.get_channel(LOGGING_CHANNEL_ID)
+        if logging_channel:
+            status = "✅" if mongo_ok and reddit_ok else "⚠️"
+            await logging_channel.send(
+                f"{status} Bot restarted at {datetime.now(UTC)} (startup {elapsed:.1f}s)\n"
+                f"Reddit auth test: {'Success' if reddit_ok else 'Failed'}\n"
+                f"MongoDB status: {'Initialized' if mongo_ok else 'Failed'}"
+            )
+        if mongo_ok:
+            print("Bot is ready!")
     except Exception as e:
         print(f"Error during startup: {e}")
-        if 'logging_channel' in locals() and logging_channel:
+        if logging_channel:
             await logging_channel.send(f"⚠️ Error during startup: {e}")
 
 @bot.event
@@ -900,66 +1772,152 @@ async def on_command_error(ctx, error):
     else:
         await send_error_dm(BOT_OWNER_ID, str(error))
 
+# ─── Keepalive Server ───────────────────────────────────────────────────────────
+# Served by aiohttp on the bot's own loop. "/" is a plain liveness answer,
+# /health reports readiness and /metrics the Prometheus metrics.
+KEEPALIVE_PORT = int(os.getenv("PORT", "8080"))
+# A channel overdue by more than this means the auto poster is stuck
+HEALTH_MAX_OVERDUE = float(os.getenv("HEALTH_MAX_OVERDUE", "600"))
+keepalive_runner = None
+health_flight = SingleFlight()
+
+async def handle_root(request):
+    return web.Response(text="Bot is alive!")
+
+async def handle_metrics(request):
+    return web.Response(body=METRICS.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def handle_health(request):
+    now = time.time()
+    try:
+        # Shared, so a hung ping can't tie up more than one Mongo worker
+        await asyncio.wait_for(health_flight.run("mongo", mongo.ping), timeout=2.0)
+        mongo_ok = True
+    except Exception:
+        mongo_ok = False
+    
+    gateway_ok = bot.is_ready() and not bot.is_closed()
+    started_at = LAST_TICK["started_at"]
+    next_due = post_scheduler.next_due()
+    overdue = max(0.0, now - next_due) if next_due is not None else 0.0
+    scheduler_ok = auto_post_loop.is_running() and overdue <= HEALTH_MAX_OVERDUE
+    # A failed startup check is superseded by any authenticated call that succeeded since
+    last_ok = reddit_budget.last_ok
+    reddit_ok = REDDIT_AUTHENTICATED or (last_ok is not None and time.monotonic() - last_ok <= HEALTH_MAX_OVERDUE)
+    ready = gateway_ok and mongo_ok and reddit_ok and scheduler_ok
+    
+    body = {
+        "status": "ok" if ready else "degraded",
+        "gateway": {"connected": gateway_ok, "latency_ms": bot.latency * 1000 if gateway_ok else None},
+        "mongo": {"reachable": mongo_ok},
+        "reddit": {
+            "authenticated": reddit_ok,
+            "startup_check": REDDIT_AUTHENTICATED,
+            "last_success_age_s": time.monotonic() - last_ok if last_ok is not None else None,
+        },
+        "scheduler": {
+            "running": auto_post_loop.is_running(),
+            "last_tick_age_s": (datetime.now(UTC) - started_at).total_seconds() if started_at else None,
+            "last_tick_duration_s": LAST_TICK["duration"],
+            "backlog": post_scheduler.backlog(now),
+            "overdue_s": overdue,
+        },
+        "event_loop": loop_watchdog.stats(),
+    }
+    return web.json_response(body, status=200 if ready else 503)
+
+keepalive_app = web.Application()
+keepalive_app.add_routes([
+    web.get("/", handle_root),
+    web.get("/health", handle_health),
+    web.get("/metrics", handle_metrics),
+])
+
+async def start_keepalive():
+    global keepalive_runner
+    keepalive_runner = web.AppRunner(keepalive_app, access_log=None)
+    await keepalive_runner.setup()
+    await web.TCPSite(keepalive_runner, "0.0.0.0", KEEPALIVE_PORT).start()
+    print(f"Keepalive server listening on port {KEEPALIVE_PORT}")
+
 # ─── Cleanup ────────────────────────────────────────────────────────────────────
 async def cleanup():
     """Cleanup resources before shutdown"""
+    if stream_task:
+        stream_task.cancel()
+    await candidate_pool.stop()
+    await loop_watchdog.stop()
+    # Don't lose buffered writes
+    await flush_write_behind()
     if session:
         await session.close()
+    if keepalive_runner:
+        await keepalive_runner.cleanup()
+    mongo.close()
 
 async def test_reddit_auth():
     """Test Reddit authentication by attempting to access user info"""
+    global REDDIT_AUTHENTICATED
     try:
         if reddit is None:
             await setup_reddit()
         me = await reddit.user.me()
-        print(f"Reddit auth test successful - logged in as: {me.name}")
-        return True
+        print(f"Reddit auth test successful - logged in as: {me.name} "
+              f"(over 18: {getattr(me, 'over_18', 'unknown')}, NSFW allowed: {getattr(me, 'nsfw_allowed', 'unknown')})")
+        REDDIT_AUTHENTICATED = True
     except Exception as e:
         print(f"Reddit auth test failed: {e}")
-        return False
+        REDDIT_AUTHENTICATED = False
+    return REDDIT_AUTHENTICATED
 
 # ─── Run Bot ────────────────────────────────────────────────────────────────────
 async def start_bot():
     """Start the bot with proper error handling"""
+    loop_watchdog.start(debug=ASYNCIO_DEBUG)
+    await start_keepalive()
     retries = 0
     max_retries = 5
     retry_delay = 60  # seconds
 
-    while retries < max_retries:
-        try:
-            print(f"Starting bot (attempt {retries + 1}/{max_retries})...")
-            await bot.start(TOKEN)
-            break
-        except LoginFailure as e:
-            retries += 1
-            print(f"Failed to login (attempt {retries}/{max_retries}): {e}")
-            if retries < max_retries:
-                wait_time = retry_delay * retries
-                print(f"Waiting {wait_time} seconds before retrying...")
-                await asyncio.sleep(wait_time)
-            else:
-                print("Max retries reached. Exiting...")
-                sys.exit(1)
-        except Exception as e:
-            retries += 1
-            print(f"Unexpected error (attempt {retries}/{max_retries}): {e}")
-            if retries < max_retries:
-                wait_time = retry_delay * retries
-                print(f"Waiting {wait_time} seconds before retrying...")
-                await asyncio.sleep(wait_time)
-            else:
-                print("Max retries reached. Exiting...")
-                sys.exit(1)
+    # Render stops the service with SIGTERM; close the bot so cleanup runs
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    except NotImplementedError:
+        pass  # Not available on Windows
+
+    try:
+        while retries < max_retries:
+            try:
+                print(f"Starting bot (attempt {retries + 1}/{max_retries})...")
+                await bot.start(TOKEN)
+                break
+            except LoginFailure as e:
+                retries += 1
+                print(f"Failed to login (attempt {retries}/{max_retries}): {e}")
+                if retries < max_retries:
+                    wait_time = retry_delay * retries
+                    print(f"Waiting {wait_time} seconds before retrying...")
+                    await asyncio.sleep(wait_time)
+                else:
+                    print("Max retries reached. Exiting...")
+                    sys.exit(1)
+            except Exception as e:
+                retries += 1
+                print(f"Unexpected error (attempt {retries}/{max_retries}): {e}")
+                if retries < max_retries:
+                    wait_time = retry_delay * retries
+                    print(f"Waiting {wait_time} seconds before retrying...")
+                    await asyncio.sleep(wait_time)
+                else:
+                    print("Max retries reached. Exiting...")
+                    sys.exit(1)
+    finally:
+        await cleanup()
 
 def main():
     """Main entry point for the bot"""
     try:
-        # Start Flask in a separate thread
-        flask_thread = Thread(target=run_flask)
-        flask_thread.daemon = True  # This ensures the Flask thread stops when the main program stops
-        flask_thread.start()
-        
-        # Start the bot
+        # Start the bot; the keepalive server runs on the same loop
         asyncio.run(start_bot())
     except KeyboardInterrupt:
         print("Bot stopped by user")
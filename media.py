@@ -0,0 +1,179 @@
+"""Media classification for Reddit submissions.
+
+Each URL is split once and dispatched on its host through a lookup table, so
+classifying a post is a dict lookup plus at most one extension check instead
+of repeated lower()/endswith()/substring scans over lists.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import NamedTuple
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".gif")
+VIDEO_EXTS = (".gifv", ".mp4", ".webm")
+
+
+class Media(NamedTuple):
+    """Classification result: what kind of media a post is and where it lives."""
+    type: str
+    url: str
+
+
+def _reddit_video(url: str, path: str, media) -> Media | None:
+    video = (media or {}).get("reddit_video") or {}
+    fallback = video.get("fallback_url")
+    return Media("reddit_video", fallback) if fallback else None
+
+
+def _reddit_image(url: str, path: str, media) -> Media:
+    return Media("direct_image", url)
+
+
+def _redgifs(url: str, path: str, media) -> Media:
+    return Media("redgifs", url)
+
+
+def _imgur(url: str, path: str, media) -> Media:
+    # Single images can be turned into direct links; albums can't
+    if path.startswith(("/a/", "/gallery/")):
+        return Media("imgur", url)
+    # .gifv/.mp4 links become their .jpg still rather than "abc.gifv.jpg"
+    if path.endswith(VIDEO_EXTS):
+        url = url[:url.rfind(".")]
+    return Media("imgur", url + ".jpg")
+
+
+# Host -> handler. Hosts are matched exactly first, then with the first label
+# stripped, which covers www./i./m. variants without listing each one.
+HOST_RULES = {
+    "i.redd.it": _reddit_image,
+    "v.redd.it": _reddit_video,
+    "redgifs.com": _redgifs,
+    "gfycat.com": _redgifs,
+    "imgur.com": _imgur,
+}
+
+
+def classify(url: str, media: dict | None = None) -> Media | None:
+    """Classify a submission URL (plus its `media` payload), or None if unsupported."""
+    if not url:
+        return None
+    # Hand-rolled split with str.find: urlsplit() alone costs more than the
+    # whole classification
+    start = url.find("://") + 3
+    if start < 3:
+        start = 0
+    slash = url.find("/", start)
+    if slash < 0:
+        host, path = url[start:], "/"
+    else:
+        host, path = url[start:slash], url[slash:]
+        cut = path.find("?")
+        if cut >= 0:
+            path = path[:cut]
+
+    # Direct image links, whatever the host
+    if path[-5:].lower().endswith(IMAGE_EXTS):
+        return Media("direct_image", url)
+
+    host = host.lower()
+    handler = HOST_RULES.get(host)
+    if handler is None:
+        handler = HOST_RULES.get(host[host.find(".") + 1:])
+    if handler is None:
+        return None
+    return handler(url, path.lower(), media)
+
+
+# Subdomains that serve the same media as the bare host
+ALIAS_PREFIXES = ("www.", "m.", "i.")
+# Hosts whose media ids are case-insensitive
+CASELESS_HOSTS = {"redgifs.com", "gfycat.com", "v.redd.it"}
+
+
+def normalize_url(url: str) -> str:
+    """Reduce a media URL to host/path so trivially different links compare equal.
+
+    Drops the scheme, query and fragment, alias subdomains of imgur/redgifs,
+    imgur file extensions and v.redd.it rendition paths, so a post URL and
+    the media URL classify() derives from it normalise to the same string.
+    """
+    start = url.find("://") + 3
+    if start < 3:
+        start = 0
+    end = len(url)
+    for sep in "?#":
+        cut = url.find(sep, start)
+        if 0 <= cut < end:
+            end = cut
+    rest = url[start:end]
+    slash = rest.find("/")
+    host, path = (rest, "") if slash < 0 else (rest[:slash], rest[slash:])
+    host = host.lower()
+    if host not in HOST_RULES and host.startswith(ALIAS_PREFIXES):
+        # Only strip when the bare host is one we know, so i.redd.it stays put
+        bare = host[host.find(".") + 1:]
+        if bare in HOST_RULES:
+            host = bare
+    path = path.rstrip("/")
+    if host == "v.redd.it":
+        # https://v.redd.it/<id>/DASH_720.mp4 -> v.redd.it/<id>
+        second = path.find("/", 1)
+        if second > 0:
+            path = path[:second]
+    elif host == "imgur.com" and not path.startswith(("/a/", "/gallery/")):
+        # Loop so keys stored for the old "abc.gifv.jpg" media URLs still match
+        dot = path.rfind(".")
+        while dot > 0 and path[dot:].lower() in IMAGE_EXTS + VIDEO_EXTS:
+            path = path[:dot]
+            dot = path.rfind(".")
+    if host in CASELESS_HOSTS:
+        path = path.lower()
+    return host + path
+
+
+def media_key(url: str) -> str:
+    """Fixed-width key (24 hex chars) for a media URL, used as sent_media's _id."""
+    return hashlib.blake2b(normalize_url(url).encode(), digest_size=12).hexdigest()
+
+
+@dataclass(frozen=True, slots=True)
+class Candidate:
+    """Everything needed to post a submission, copied out of the listing once.
+
+    Holding these instead of asyncpraw Submission objects keeps pooled
+    candidates small and means building the embed can never trigger a lazy
+    API fetch.
+    """
+    id: str
+    url: str
+    title: str
+    permalink: str
+    score: int
+    num_comments: int
+    created_utc: float
+    author: str
+    subreddit: str
+    thumbnail: str | None
+    media_url: str
+    media_type: str
+
+    @classmethod
+    def from_submission(cls, post, media: Media) -> "Candidate":
+        # Both attributes are built from the listing JSON; reading the name
+        # and display_name doesn't fetch anything
+        author = post.author.name if post.author else "[deleted]"
+        thumbnail = getattr(post, "thumbnail", None)
+        return cls(
+            id=post.id,
+            url=post.url,
+            title=post.title,
+            permalink=post.permalink,
+            score=post.score,
+            num_comments=post.num_comments,
+            created_utc=post.created_utc,
+            author=author,
+            subreddit=post.subreddit.display_name,
+            thumbnail=thumbnail if thumbnail and thumbnail.startswith("http") else None,
+            media_url=media.url,
+            media_type=media.type,
+        )
@@ -0,0 +1,150 @@
+"""Minimal Prometheus text-format metrics.
+
+Counters, gauges and fixed-bucket histograms with optional labels, plus
+metrics whose value is read from a callback at scrape time. Nothing here is
+thread-safe: observe and render from the event loop.
+"""
+import math
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    """Sample value in the exposition format; floats keep full precision."""
+    if not isinstance(value, float):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    # repr() round-trips; "%g" would cut growing sums to 6 significant digits
+    return repr(value)
+
+
+def _format(name: str, labels: dict, value) -> str:
+    if labels:
+        inner = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+        name = f"{name}{{{inner}}}"
+    return f"{name} {_number(value)}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), fn=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # Scrape-time source: returns a number, or {label values tuple: number}
+        self.fn = fn
+        self.values = {}  # label values tuple -> value
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _current(self) -> dict:
+        if self.fn is None:
+            return self.values
+        value = self.fn()
+        return value if isinstance(value, dict) else {(): value}
+
+    def lines(self) -> list[str]:
+        lines = []
+        for key, value in self._current().items():
+            if value is not None:
+                lines.append(_format(self.name, dict(zip(self.labels, key)), value))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def lines(self) -> list[str]:
+        lines = []
+        for key, (counts, total, count) in self.values.items():
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(_format(f"{self.name}_bucket", {**labels, "le": _number(float(bound))}, cumulative))
+            lines.append(_format(f"{self.name}_bucket", {**labels, "le": "+Inf"}, count))
+            lines.append(_format(f"{self.name}_sum", labels, total))
+            lines.append(_format(f"{self.name}_count", labels, count))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = (), fn=None) -> Counter:
+        return self._add(Counter(name, help, labels, fn))
+
+    def gauge(self, name: str, help: str, labels: tuple = (), fn=None) -> Gauge:
+        return self._add(Gauge(name, help, labels, fn))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        out = []
+        for metric in self.metrics:
+            try:
+                lines = metric.lines()
+            except Exception as e:
+                # One broken callback shouldn't take the whole scrape down
+                out.append(f"# {metric.name} unavailable: {_escape(e)}")
+                continue
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
@@ -0,0 +1,149 @@
+"""Per-subreddit pools of prefetched, not-yet-sent media candidates."""
+import time
+import random
+import asyncio
+from collections import deque
+
+
+class CandidatePool:
+    """Keeps a few classified candidates ready for each subreddit.
+
+    pop() is O(1) and never touches the network. When a pool drops below the
+    low watermark the subreddit is queued for the background refiller, which
+    tops it back up to the high watermark using the supplied fetcher. The
+    fetcher takes a batch of subreddits so it can serve several queued pools
+    with one request.
+    """
+
+    def __init__(self, fetcher, key=lambda c: c.url, low: int = 3, high: int = 10,
+                 max_age: float = 3600.0, concurrency: int = 2, batch_size: int = 10):
+        self.fetcher = fetcher  # async (list of subreddits) -> {subreddit: candidates}
+        self.batch_size = batch_size
+        self.key = key
+        self.low = low
+        self.high = high
+        self.max_age = max_age
+        self.concurrency = concurrency
+        self.pools = {}  # subreddit -> deque of (fetched_at, candidate)
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_errors = 0
+        self._wanted = deque()
+        self._wanted_set = set()
+        self._event = asyncio.Event()
+        self._tasks = []
+
+    def __len__(self):
+        return sum(len(pool) for pool in self.pools.values())
+
+    def depth(self, subreddit: str) -> int:
+        return len(self.pools.get(subreddit, ()))
+
+    def _drop_stale(self, pool: deque):
+        cutoff = time.monotonic() - self.max_age
+        while pool and pool[0][0] < cutoff:
+            pool.popleft()
+
+    def pop(self, subreddit: str):
+        """Take a ready candidate, or None if the pool is empty."""
+        pool = self.pools.get(subreddit)
+        if pool:
+            self._drop_stale(pool)
+        if not pool:
+            self.misses += 1
+            self.request_refill(subreddit)
+            return None
+        self.hits += 1
+        _, candidate = pool.popleft()
+        if len(pool) < self.low:
+            self.request_refill(subreddit)
+        return candidate
+
+    def add(self, subreddit: str, candidates: list):
+        """Add candidates (e.g. leftovers of a live fetch) up to the high watermark."""
+        pool = self.pools.setdefault(subreddit, deque())
+        known = {self.key(c) for _, c in pool}
+        fresh = [c for c in candidates if self.key(c) not in known]
+        random.shuffle(fresh)  # keep the variety the old random pick gave
+        now = time.monotonic()
+        for candidate in fresh[:max(0, self.high - len(pool))]:
+            pool.append((now, candidate))
+
+    def discard(self, subreddit: str):
+        self.pools.pop(subreddit, None)
+
+    def request_refill(self, subreddit: str):
+        if subreddit not in self._wanted_set:
+            self._wanted_set.add(subreddit)
+            self._wanted.append(subreddit)
+            self._event.set()
+
+    async def _fetch_into(self, subreddits: list[str]):
+        results = await self.fetcher(subreddits)
+        for subreddit in subreddits:
+            self.add(subreddit, results.get(subreddit) or [])
+        self.refills += 1
+
+    async def fill(self, subreddits):
+        """Synchronously fetch for any of these subreddits whose pool is empty."""
+        empty = []
+        for subreddit in dict.fromkeys(subreddits):
+            pool = self.pools.get(subreddit)
+            if pool:
+                self._drop_stale(pool)
+            if not pool:
+                empty.append(subreddit)
+        if empty:
+            try:
+                await self._fetch_into(empty)
+            except Exception as e:
+                self.refill_errors += 1
+                print(f"Error filling candidate pools: {e}")
+
+    async def _refiller(self):
+        while True:
+            if not self._wanted:
+                self._event.clear()
+                await self._event.wait()
+                continue
+            batch = []
+            while self._wanted and len(batch) < self.batch_size:
+                subreddit = self._wanted.popleft()
+                if self.depth(subreddit) >= self.low:
+                    self._wanted_set.discard(subreddit)
+                else:
+                    batch.append(subreddit)
+            if not batch:
+                continue
+            try:
+                await self._fetch_into(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.refill_errors += 1
+                print(f"Error refilling candidate pools for {', '.join(batch)}: {e}")
+            finally:
+                self._wanted_set.difference_update(batch)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._refiller()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "refills": self.refills,
+            "refill_errors": self.refill_errors,
+            "queued": len(self._wanted),
+            "depth": len(self),
+        }
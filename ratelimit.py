@@ -0,0 +1,107 @@
+"""Reddit API budget tracking and request coalescing."""
+import time
+import asyncio
+
+from asyncprawcore import Requestor
+
+
+class RateBudget:
+    """Token bucket fed from Reddit's X-Ratelimit-* response headers.
+
+    Reddit reports how many requests are left in the current window and how
+    many seconds until it resets. Each request takes one token; when none are
+    left callers queue until the reset instead of running into 429s.
+    """
+
+    def __init__(self, reserve: int = 2):
+        self.reserve = reserve  # tokens kept back to absorb header lag
+        self.remaining = None  # unknown until the first response
+        self.used = 0
+        self.reset_at = 0.0
+        self.capacity = None
+        self.requests = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.throttled = 0
+        self.last_ok = None  # monotonic time of the last 2xx response
+
+    async def acquire(self):
+        while self.remaining is not None and self.remaining - self.reserve < 1:
+            delay = self.reset_at - time.monotonic()
+            if delay <= 0:
+                # Window rolled over; assume a full budget until headers say otherwise
+                self.remaining = self.capacity
+                break
+            self.waits += 1
+            self.wait_time += delay
+            print(f"Reddit rate limit reached, queueing for {delay:.1f}s")
+            await asyncio.sleep(delay)
+        if self.remaining is not None:
+            self.remaining -= 1
+        self.requests += 1
+
+    def update(self, headers, status: int | None = None):
+        if status is not None and 200 <= status < 300:
+            self.last_ok = time.monotonic()
+        try:
+            remaining = float(headers["x-ratelimit-remaining"])
+            reset = float(headers["x-ratelimit-reset"])
+            used = float(headers.get("x-ratelimit-used", 0))
+        except (KeyError, TypeError, ValueError):
+            return
+        self.remaining = remaining
+        self.used = used
+        self.reset_at = time.monotonic() + reset
+        self.capacity = max(self.capacity or 0, remaining + used)
+        if status == 429:
+            self.throttled += 1
+            self.remaining = 0
+
+    def stats(self) -> dict:
+        return {
+            "remaining": self.remaining,
+            "capacity": self.capacity,
+            "reset_in": max(0.0, self.reset_at - time.monotonic()),
+            "requests": self.requests,
+            "waits": self.waits,
+            "wait_time": self.wait_time,
+            "throttled": self.throttled,
+        }
+
+
+class BudgetRequestor(Requestor):
+    """asyncprawcore requestor that spends a RateBudget token per API call."""
+
+    def __init__(self, *args, budget: RateBudget, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.budget = budget
+
+    async def request(self, *args, **kwargs):
+        # Token requests go to www.reddit.com and don't count against the quota
+        url = args[1] if len(args) > 1 else kwargs.get("url", "")
+        if not str(url).startswith(self.oauth_url):
+            return await super().request(*args, **kwargs)
+        await self.budget.acquire()
+        response = await super().request(*args, **kwargs)
+        self.budget.update(response.headers, response.status)
+        return response
+
+
+class SingleFlight:
+    """Let concurrent callers asking for the same key share one in-flight call."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def run(self, key, fn, *args, **kwargs):
+        future = self._inflight.get(key)
+        if future is not None:
+            self.shared += 1
+            return await asyncio.shield(future)
+        self.calls += 1
+        future = asyncio.ensure_future(fn(*args, **kwargs))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
@@ -0,0 +1,76 @@
+"""Due-time scheduling for the auto poster."""
+import time
+import heapq
+import asyncio
+
+
+class DueScheduler:
+    """Min-heap of (next_due, channel_id) with lazy invalidation.
+
+    Rescheduling a channel pushes a new entry and leaves the old one in the
+    heap; stale entries are recognised by comparing against _due_at and are
+    skipped when they surface. Times are Unix timestamps.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._due_at = {}  # channel_id -> current due timestamp
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._due_at)
+
+    def __contains__(self, channel_id):
+        return channel_id in self._due_at
+
+    def schedule(self, channel_id: int, due_at: float):
+        self._due_at[channel_id] = due_at
+        heapq.heappush(self._heap, (due_at, channel_id))
+        # Wake the waiter in case this is now the earliest deadline
+        self._wakeup.set()
+
+    def remove(self, channel_id: int):
+        self._due_at.pop(channel_id, None)
+
+    def clear(self):
+        self._heap.clear()
+        self._due_at.clear()
+        self._wakeup.set()
+
+    def _prune(self):
+        while self._heap and self._due_at.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> float | None:
+        self._prune()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float | None = None) -> list[int]:
+        """Remove and return every channel whose deadline has passed."""
+        now = time.time() if now is None else now
+        due = []
+        while True:
+            self._prune()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, channel_id = heapq.heappop(self._heap)
+            del self._due_at[channel_id]
+            due.append(channel_id)
+
+    def backlog(self, now: float | None = None) -> int:
+        """Number of channels already past their deadline."""
+        now = time.time() if now is None else now
+        return sum(1 for due_at in self._due_at.values() if due_at <= now)
+
+    async def wait(self):
+        """Sleep until the earliest deadline, re-arming whenever it changes."""
+        while True:
+            self._wakeup.clear()
+            next_due = self.next_due()
+            timeout = None if next_due is None else next_due - time.time()
+            if timeout is not None and timeout <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
@@ -0,0 +1,273 @@
+"""In-process MongoDB stand-in for the tests and the offline benchmarks.
+
+FakeMongoClient mimics the slice of pymongo's blocking API the bot uses:
+dict-backed collections with equality/$in/$exists/$type queries, $set/$inc
+updates, bulk writes, declared indexes and collStats. Setting
+FakeMongoClient.latency makes every call sleep in the calling thread to model
+a network round-trip.
+"""
+import time
+import threading
+from types import SimpleNamespace
+
+import bson
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import OperationFailure
+
+
+_MISSING = object()
+
+
+def _get_path(doc: dict, key: str):
+    for part in key.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _set_path(doc: dict, key: str, value):
+    *parents, last = key.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _matches(doc: dict, query: dict | None) -> bool:
+    for key, cond in (query or {}).items():
+        value = _get_path(doc, key)
+        if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            for op, arg in cond.items():
+                if op == "$in" and (value is _MISSING or value not in arg):
+                    return False
+                if op == "$exists" and (value is not _MISSING) != bool(arg):
+                    return False
+                if op == "$type" and not (arg == "objectId" and isinstance(value, ObjectId)):
+                    return False
+        elif value is _MISSING or value != cond:
+            return False
+    return True
+
+
+def _project(doc: dict, projection) -> dict:
+    if not projection:
+        return dict(doc)
+    keep = {k for k, v in projection.items() if v}
+    result = {k: v for k, v in doc.items() if k in keep}
+    if projection.get("_id", 1) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    return result
+
+
+class FakeCollection:
+    """Dict-backed collection with pymongo's blocking call signatures."""
+
+    def __init__(self, database, name: str):
+        self.database = database
+        self.name = name
+        self.docs = {}  # _id -> document
+        # Lazily built hash indexes for equality queries, so write-behind
+        # upserts don't turn into a scan per document:
+        # fields -> {values: [_id, ...]}
+        self._indexes = {}
+        # Declared indexes as create_index names them; only used for
+        # index_information() and collStats, never for lookups
+        self.index_specs = {"_id_": [("_id", 1)]}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        self.docs.clear()
+        self._indexes.clear()
+
+    def _round_trip(self):
+        if self.database.client.latency:
+            time.sleep(self.database.client.latency)
+
+    def _update(self, query: dict, update: dict, upsert: bool):
+        doc = next((d for d in self._scan(query)), None)
+        inserted = doc is None
+        if inserted:
+            if not upsert:
+                return None, False
+            doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+            doc.setdefault("_id", ObjectId())
+        changed = {key.split(".")[0] for fields in update.values() for key in fields}
+        for fields in [f for f in self._indexes if changed & set(f)]:
+            del self._indexes[fields]
+        for op, fields in update.items():
+            for key, arg in fields.items():
+                current = _get_path(doc, key)
+                if op == "$set" or (op == "$setOnInsert" and inserted):
+                    _set_path(doc, key, arg)
+                elif op == "$inc":
+                    _set_path(doc, key, (0 if current is _MISSING else current) + arg)
+                elif op == "$max" and (current is _MISSING or arg > current):
+                    _set_path(doc, key, arg)
+                elif op == "$addToSet":
+                    items = [] if current is _MISSING else current
+                    if arg not in items:
+                        _set_path(doc, key, items + [arg])
+                elif op == "$pull" and current is not _MISSING:
+                    _set_path(doc, key, [item for item in current if item != arg])
+        if inserted:
+            self._store(doc)
+        return doc, inserted
+
+    def _store(self, doc: dict):
+        self.docs[doc["_id"]] = doc
+        for fields, index in self._indexes.items():
+            index.setdefault(tuple(doc.get(f, _MISSING) for f in fields), []).append(doc["_id"])
+
+    def _remove(self, doc: dict):
+        del self.docs[doc["_id"]]
+        self._indexes.clear()
+
+    def _scan(self, query):
+        if query and set(query) == {"_id"} and not isinstance(query["_id"], dict):
+            doc = self.docs.get(query["_id"])
+            return [doc] if doc is not None else []
+        if query and not any(isinstance(v, dict) for v in query.values()):
+            fields = tuple(sorted(query))
+            index = self._indexes.get(fields)
+            if index is None:
+                index = self._indexes[fields] = {}
+                for doc in self.docs.values():
+                    index.setdefault(tuple(doc.get(f, _MISSING) for f in fields), []).append(doc["_id"])
+            return [self.docs[i] for i in index.get(tuple(query[f] for f in fields), ())]
+        return [doc for doc in self.docs.values() if _matches(doc, query)]
+
+    def find(self, query=None, projection=None, limit: int = 0, **kwargs):
+        self._round_trip()
+        with self._lock:
+            docs = self._scan(query)
+        return [_project(doc, projection) for doc in (docs[:limit] if limit else docs)]
+
+    def find_one(self, query=None, projection=None, **kwargs):
+        docs = self.find(query, projection, limit=1)
+        return docs[0] if docs else None
+
+    def count_documents(self, query, limit: int = 0, **kwargs):
+        return len(self.find(query, limit=limit))
+
+    def insert_one(self, doc: dict):
+        self._round_trip()
+        with self._lock:
+            doc.setdefault("_id", ObjectId())
+            self._store(dict(doc))
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    def update_one(self, query, update, upsert: bool = False):
+        self._round_trip()
+        with self._lock:
+            doc, inserted = self._update(query, update, upsert)
+        return SimpleNamespace(matched_count=int(doc is not None and not inserted),
+                               upserted_id=doc["_id"] if inserted else None)
+
+    def find_one_and_update(self, query, update, upsert: bool = False, **kwargs):
+        self._round_trip()
+        with self._lock:
+            doc, _ = self._update(query, update, upsert)
+        return dict(doc) if doc else None
+
+    def delete_one(self, query):
+        self._round_trip()
+        with self._lock:
+            docs = self._scan(query)[:1]
+            for doc in docs:
+                self._remove(doc)
+        return SimpleNamespace(deleted_count=len(docs))
+
+    def delete_many(self, query):
+        self._round_trip()
+        with self._lock:
+            docs = self._scan(query)
+            for doc in docs:
+                self._remove(doc)
+        return SimpleNamespace(deleted_count=len(docs))
+
+    def bulk_write(self, ops, ordered: bool = True):
+        self._round_trip()
+        with self._lock:
+            for op in ops:
+                if isinstance(op, UpdateOne):
+                    self._update(op._filter, op._doc, op._upsert)
+                elif isinstance(op, DeleteOne):
+                    for doc in self._scan(op._filter)[:1]:
+                        self._remove(doc)
+        return SimpleNamespace(acknowledged=True)
+
+    def create_index(self, keys, **kwargs):
+        keys = [(keys, 1)] if isinstance(keys, str) else list(keys)
+        name = kwargs.get("name") or "_".join(f"{k}_{d}" for k, d in keys)
+        self.index_specs.setdefault(name, keys)
+        return name
+
+    def index_information(self):
+        return {name: {"key": keys} for name, keys in self.index_specs.items()}
+
+    def drop_index(self, name):
+        if name == "_id_" or self.index_specs.pop(name, None) is None:
+            raise OperationFailure(f"index not found with name [{name}]")
+
+    def coll_stats(self) -> dict:
+        """collStats fields the bot reads, with sizes taken from the BSON encoding."""
+        with self._lock:
+            docs = list(self.docs.values())
+        size = sum(len(bson.encode(doc)) for doc in docs)
+        index_sizes = {}
+        for name, keys in self.index_specs.items():
+            # Key BSON plus the record id a real index entry points at
+            index_sizes[name] = sum(
+                len(bson.encode({k: _get_path(doc, k) for k, _ in keys if _get_path(doc, k) is not _MISSING})) + 8
+                for doc in docs
+            )
+        return {
+            "ns": f"{self.database.name}.{self.name}",
+            "count": len(docs),
+            "size": size,
+            "avgObjSize": size // len(docs) if docs else 0,
+            "nindexes": len(index_sizes),
+            "indexSizes": index_sizes,
+            "totalIndexSize": sum(index_sizes.values()),
+            "ok": 1.0,
+        }
+
+
+class FakeDatabase:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+        self.collections = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self, name)
+        return self.collections[name]
+
+    def command(self, name, *args, **kwargs):
+        if self.client.latency:
+            time.sleep(self.client.latency)
+        if name == "collStats" and args:
+            return self[args[0]].coll_stats()
+        raise OperationFailure(f"no such command: '{name}'")
+
+
+class FakeMongoClient:
+    """pymongo.MongoClient stand-in; latency is the simulated round-trip in seconds."""
+
+    latency = 0.0
+
+    def __init__(self, *args, **kwargs):
+        self.databases = {}
+        self.admin = SimpleNamespace(command=self._command)
+
+    def _command(self, name, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return {"ok": 1.0}
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        if name not in self.databases:
+            self.databases[name] = FakeDatabase(self, name)
+        return self.databases[name]
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+from fakes_mongo import FakeMongoClient
+from db import MongoRepository, ConfigCache
+
+
+def make_cache():
+    repo = MongoRepository(FakeMongoClient()["test"])
+    collection = repo.collection("channel_configs")
+    return ConfigCache(collection), collection
+
+
+def test_update_writes_through():
+    async def run():
+        cache, collection = make_cache()
+        await cache.load()
+        version = cache.version
+        doc = await cache.update(1, {"$set": {"subs": ["pics"]}}, upsert=True)
+        assert doc["subs"] == ["pics"]
+        assert cache.get(1)["subs"] == ["pics"]
+        assert (await collection.find_one({"channel_id": 1}))["subs"] == ["pics"]
+        assert cache.version > version
+
+        await cache.delete(1)
+        assert cache.get(1) == {}
+        assert await collection.find_one({"channel_id": 1}) is None
+    asyncio.run(run())
+
+
+def test_refresh_picks_up_external_edit():
+    async def run():
+        cache, collection = make_cache()
+        await collection.insert_one({"channel_id": 1, "subs": ["pics"]})
+        await collection.insert_one({"channel_id": 2, "subs": ["aww"]})
+        await cache.load()
+
+        # Edited and removed by something other than the bot
+        await collection.update_one({"channel_id": 1}, {"$set": {"subs": ["earthporn"]}})
+        await collection.delete_one({"channel_id": 2})
+        assert cache.get(1)["subs"] == ["pics"]
+
+        version = cache.version
+        assert await cache.refresh() == {1, 2}
+        assert cache.get(1)["subs"] == ["earthporn"]
+        assert cache.get(2) == {}
+        assert cache.version > version
+        assert await cache.refresh() == set()
+    asyncio.run(run())
+
+
+def test_write_during_load_survives_older_snapshot():
+    async def run():
+        cache, collection = make_cache()
+        await collection.insert_one({"channel_id": 1, "subs": ["pics"]})
+        await collection.insert_one({"channel_id": 2, "subs": ["aww"]})
+        await cache.load()
+
+        # Hold the reload's find() after it has read its snapshot
+        snapshot_taken, release = threading.Event(), threading.Event()
+        find = collection.collection.find
+
+        def slow_find(*args, **kwargs):
+            docs = find(*args, **kwargs)
+            snapshot_taken.set()
+            release.wait(5)
+            return docs
+        collection.collection.find = slow_find
+
+        reload = asyncio.create_task(cache.refresh())
+        await asyncio.to_thread(snapshot_taken.wait, 5)
+        collection.collection.find = find
+        await cache.update(1, {"$set": {"subs": ["earthporn"]}})
+        await cache.delete(2)
+        release.set()
+        await reload
+
+        assert cache.get(1)["subs"] == ["earthporn"]
+        assert cache.get(2) == {}
+    asyncio.run(run())
@@ -0,0 +1,37 @@
+import pytest
+
+from media import classify, normalize_url, media_key
+
+
+# A post URL and the media URL classify() derives from it must share a key,
+# since dedup checks the former and marks the latter as sent
+@pytest.mark.parametrize("post_url", [
+    "https://imgur.com/abc",
+    "https://i.imgur.com/abc.jpg",
+    "https://i.imgur.com/abc.gifv",
+    "https://i.imgur.com/abc.mp4",
+    "https://i.redd.it/xyz.png",
+    "https://redgifs.com/watch/SomeClip",
+    "https://imgur.com/a/album",
+])
+def test_post_and_media_url_share_key(post_url):
+    media = classify(post_url)
+    assert media is not None
+    assert media_key(media.url) == media_key(post_url)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://i.imgur.com/abc.gifv", "imgur.com/abc"),
+    ("https://i.imgur.com/abc.gifv.jpg", "imgur.com/abc"),
+    ("http://www.imgur.com/abc.PNG?x=1#frag", "imgur.com/abc"),
+    ("https://imgur.com/a/album/", "imgur.com/a/album"),
+    ("https://v.redd.it/AbC123/DASH_720.mp4", "v.redd.it/abc123"),
+    ("https://www.redgifs.com/watch/SomeClip", "redgifs.com/watch/someclip"),
+    ("https://i.redd.it/XyZ.png", "i.redd.it/XyZ.png"),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def test_imgur_video_classifies_to_still():
+    assert classify("https://i.imgur.com/abc.gifv").url == "https://i.imgur.com/abc.jpg"
@@ -0,0 +1,25 @@
+from metrics import Registry
+
+
+def test_floats_keep_full_precision():
+    registry = Registry()
+    registry.gauge("big", "a large gauge").set(16000000.25)
+    histogram = registry.histogram("latency_seconds", "a histogram", buckets=(0.005, 1.0))
+    histogram.observe(1234567.891)
+    text = registry.render()
+    assert "big 16000000.25\n" in text
+    assert "latency_seconds_sum 1234567.891\n" in text
+    assert 'latency_seconds_bucket{le="0.005"} 0\n' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 1\n' in text
+
+
+def test_special_values():
+    registry = Registry()
+    gauge = registry.gauge("g", "special values", labels=("kind",))
+    gauge.set(float("inf"), kind="pos")
+    gauge.set(float("-inf"), kind="neg")
+    gauge.set(float("nan"), kind="nan")
+    gauge.set(3, kind="int")
+    text = registry.render()
+    for line in ('g{kind="pos"} +Inf', 'g{kind="neg"} -Inf', 'g{kind="nan"} NaN', 'g{kind="int"} 3'):
+        assert line in text
@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, UTC
+
+import pytest
+
+from fakes_mongo import FakeMongoClient
+from db import MongoRepository, LastSentStore, ListingCursorStore, RotationStore
+
+
+def make_collection():
+    return MongoRepository(FakeMongoClient()["test"]).collection("stats")
+
+
+def test_flush_upserts_latest_values():
+    async def run():
+        collection = make_collection()
+        rotation = RotationStore(collection)
+        rotation.mark(1, "pics")
+        rotation.mark(1, "aww")
+        rotation.mark(2, "pics")
+        assert await rotation.flush() == 2
+        assert await rotation.flush() == 0
+
+        restored = RotationStore(collection)
+        assert await restored.load() == 2
+        assert restored.last == {1: "aww", 2: "pics"}
+    asyncio.run(run())
+
+
+def test_failed_flush_is_retried_with_newer_value():
+    async def run():
+        collection = make_collection()
+        cursors = ListingCursorStore(collection)
+        cursors.advance("pics", "t3_a", 1.0)
+
+        write = collection.collection.bulk_write
+        def failing(*args, **kwargs):
+            raise ConnectionError("down")
+        collection.collection.bulk_write = failing
+        with pytest.raises(ConnectionError):
+            await cursors.flush()
+        assert cursors.pending == {"pics"}
+
+        cursors.advance("pics", "t3_b", 2.0)
+        collection.collection.bulk_write = write
+        assert await cursors.flush() == 1
+        doc = await collection.find_one({"type": "listing_cursor", "subreddit": "pics"})
+        assert (doc["fullname"], doc["created_utc"]) == ("t3_b", 2.0)
+    asyncio.run(run())
+
+
+def test_last_sent_migrates_legacy_map():
+    async def run():
+        collection = make_collection()
+        older, newer = datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 6, 1, tzinfo=UTC)
+        await collection.insert_one({"type": "last_sent", "data": {"1": older.isoformat(), "2": older.isoformat()}})
+        await collection.insert_one({"type": "last_sent", "channel_id": 2, "time": newer})
+
+        store = LastSentStore(collection)
+        assert await store.load() == {1: older, 2: newer}
+        assert await collection.find_one({"type": "last_sent", "data": {"$exists": True}}) is None
+        assert (await collection.find_one({"type": "last_sent", "channel_id": 1}))["time"] == older
+    asyncio.run(run())